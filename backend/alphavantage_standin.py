@@ -0,0 +1,151 @@
+"""Offline stand-in for the Alpha Vantage API, for load tests and benchmarks.
+
+Replays the fixtures in fixtures/alphavantage for every function fetch_stock_data uses,
+for any symbol, with configurable latency and error injection. Point the backend at it
+with ALPHAVANTAGE_BASE_URL:
+
+    uvicorn alphavantage_standin:app --port 8001
+    ALPHAVANTAGE_BASE_URL=http://localhost:8001/query uvicorn app.main:app
+
+For throughput runs also raise ALPHAVANTAGE_REQUESTS_PER_MINUTE, otherwise the
+backend's rate limiter (sized for the real API tier) is what gets measured.
+
+Behaviour is controlled with environment variables:
+
+    STANDIN_LATENCY_MS     base latency added to every response (default 0)
+    STANDIN_JITTER_MS      extra uniformly random latency (default 0)
+    STANDIN_ERROR_RATE     fraction of requests answered with HTTP 500 (default 0)
+    STANDIN_QUOTA_RATE     fraction of requests answered with a rate-limit "Note" (default 0)
+
+Fixtures are looked up as {FUNCTION}_{SYMBOL}.json, then {FUNCTION}.json with the
+recorded symbol swapped for the requested one. Record a symbol's fixtures from the
+live API with the command below; it writes {FUNCTION}_{SYMBOL}.json, and {FUNCTION}.json
+too when no shared fallback exists yet:
+
+    python alphavantage_standin.py record IBM
+"""
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict
+from fastapi import FastAPI, HTTPException, Query
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "alphavantage")
+FUNCTIONS = ["GLOBAL_QUOTE", "OVERVIEW", "INCOME_STATEMENT", "BALANCE_SHEET", "TIME_SERIES_DAILY_ADJUSTED", "NEWS_SENTIMENT"]
+COMPACT_SIZE = 100
+
+LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "0"))
+JITTER_MS = float(os.getenv("STANDIN_JITTER_MS", "0"))
+ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))
+QUOTA_RATE = float(os.getenv("STANDIN_QUOTA_RATE", "0"))
+
+app = FastAPI(title="Alpha Vantage stand-in")
+
+_fixtures: Dict[str, Any] = {}
+
+def _load_fixture(function: str, symbol: str) -> Any:
+    for name in (f"{function}_{symbol}", function):
+        if name not in _fixtures:
+            path = os.path.join(FIXTURE_DIR, f"{name}.json")
+            _fixtures[name] = None
+            if os.path.exists(path):
+                with open(path) as f:
+                    _fixtures[name] = json.load(f)
+        if _fixtures[name] is not None:
+            payload = copy.deepcopy(_fixtures[name])
+            return payload if name != function else _replace_symbol(payload, _recorded_symbol(payload), symbol)
+    return None
+
+def _recorded_symbol(payload: Any) -> str:
+    if "Global Quote" in payload:
+        return payload["Global Quote"].get("01. symbol", "IBM")
+    if "Meta Data" in payload:
+        return payload["Meta Data"].get("2. Symbol", "IBM")
+    return payload.get("Symbol") or payload.get("symbol") or "IBM"
+
+def _replace_symbol(payload: Any, recorded: str, symbol: str) -> Any:
+    if isinstance(payload, dict):
+        return {key: _replace_symbol(value, recorded, symbol) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [_replace_symbol(value, recorded, symbol) for value in payload]
+    if isinstance(payload, str) and recorded in payload:
+        return payload.replace(recorded, symbol)
+    return payload
+
+def _previous_business_day(day: date) -> date:
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+def _shift_daily_series(payload: Dict[str, Any], outputsize: str) -> Dict[str, Any]:
+    """Re-date the recorded bars so the newest one is the last completed trading day"""
+    bars = [payload["Time Series (Daily)"][day] for day in sorted(payload["Time Series (Daily)"], reverse=True)]
+    if outputsize != "full":
+        bars = bars[:COMPACT_SIZE]
+    series = {}
+    day = date.today()
+    for bar in bars:
+        day = _previous_business_day(day)
+        series[day.isoformat()] = bar
+    payload["Time Series (Daily)"] = series
+    payload["Meta Data"]["3. Last Refreshed"] = next(iter(series), "")
+    payload["Meta Data"]["4. Output Size"] = "Full size" if outputsize == "full" else "Compact"
+    return payload
+
+@app.get("/query")
+async def query(
+    function: str,
+    symbol: str = Query(None),
+    tickers: str = Query(None),
+    outputsize: str = "compact"
+):
+    delay = LATENCY_MS + random.uniform(0, JITTER_MS)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+    if random.random() < ERROR_RATE:
+        raise HTTPException(status_code=500, detail="Injected stand-in error")
+    if random.random() < QUOTA_RATE:
+        return {"Note": "Thank you for using Alpha Vantage! This is the stand-in's simulated rate limit."}
+
+    symbol = (symbol or tickers or "").upper()
+    payload = _load_fixture(function.upper(), symbol)
+    if payload is None:
+        return {"Error Message": f"Invalid API call. The stand-in has no fixture for {function}."}
+    if function.upper() == "TIME_SERIES_DAILY_ADJUSTED":
+        payload = _shift_daily_series(payload, outputsize)
+    return payload
+
+def record(symbol: str):
+    """Record live responses for symbol into the fixture directory (needs network and an API key)"""
+    import httpx
+    from app.config import settings
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for function in FUNCTIONS:
+        params = {"function": function, "apikey": settings.alphavantage_api_key}
+        if function == "NEWS_SENTIMENT":
+            params["tickers"] = symbol
+        else:
+            params["symbol"] = symbol
+        if function == "TIME_SERIES_DAILY_ADJUSTED":
+            params["outputsize"] = "full"
+        payload = httpx.get("https://www.alphavantage.co/query", params=params, timeout=30).json()
+        # The symbol's own fixture, plus the shared fallback for other symbols if there is none yet
+        names = [f"{function}_{symbol}"]
+        if not os.path.exists(os.path.join(FIXTURE_DIR, f"{function}.json")):
+            names.append(function)
+        for name in names:
+            with open(os.path.join(FIXTURE_DIR, f"{name}.json"), "w") as f:
+                json.dump(payload, f, indent=2)
+        print(f"Recorded {function} for {symbol}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "record":
+        record(sys.argv[2].upper())
+    else:
+        print("Usage: python alphavantage_standin.py record SYMBOL")
@@ -7,10 +7,65 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     jwt_expiration: int = 3600
     alphavantage_api_key: str
+    alphavantage_base_url: str = "https://www.alphavantage.co/query"  # point at alphavantage_standin.py for offline benchmarks
+    alphavantage_section_timeout: float = 10.0  # per upstream request, excluding time queued on the rate limiter
+    alphavantage_requests_per_minute: int = 75  # match the subscribed Alpha Vantage tier
+    alphavantage_burst: int = 5
+    stock_batch_concurrency: int = 4
+    price_store_path: str = "local_storage/prices"
+    price_store_refresh_interval: int = 3600
+    alphavantage_cache_max_entries: int = 2048
+    alphavantage_cache_path: str = "local_storage/alphavantage_cache.sqlite3"  # empty string keeps the cache in memory only
+    alphavantage_quote_ttl: int = 60
+    alphavantage_indicator_ttl: int = 6 * 3600
+    alphavantage_fundamentals_ttl: int = 7 * 86400
+    alphavantage_stale_ttl: int = 7 * 86400  # how long past expiry a cached value may still be served as stale
+    alphavantage_breaker_failure_threshold: int = 5
+    alphavantage_breaker_reset_timeout: float = 30.0
     gemini_api_key: str = ""  # Fixed syntax error here
+    gemini_model: str = "gemini-1.5-pro"
+    llm_provider: str = "gemini"  # "local" swaps in the offline stand-in from llm_provider.py
+    local_embedding_dim: int = 768  # same as models/embedding-001
+    local_llm_latency_ms: float = 800.0
+    local_llm_tokens_per_second: float = 50.0
+    gemini_max_concurrency: int = 8
+    gemini_embed_max_concurrency: int = 16
+    embedding_cache_path: str = "local_storage/embedding_cache.sqlite3"  # empty string keeps the cache in memory only
+    embedding_cache_max_entries: int = 200_000
+    embedding_batch_size: int = 100  # the embedContents API accepts at most 100 texts per request
+    embedding_batch_concurrency: int = 4
+    embedding_batch_retries: int = 3
+    document_analysis_max_chars: int = 12_000  # longer documents are map-reduced instead of sent whole
+    document_summary_concurrency: int = 8
+    document_summary_words: int = 200
+    document_summary_cache_path: str = "local_storage/summary_cache.sqlite3"  # empty string keeps the cache in memory only
+    document_summary_cache_max_entries: int = 20_000
+    document_summary_cache_ttl: int = 30 * 86400
+    upload_spool_dir: str = "local_storage/uploads"
+    upload_max_bytes: int = 100 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    pdf_parallel_min_pages: int = 40  # smaller documents are parsed in one thread
+    pdf_extract_pages_per_task: int = 16
+    pdf_extract_workers: int = 0  # 0 uses one process per CPU core
+    ingest_workers: int = 2
+    ingest_job_dir: str = "local_storage/ingest"
+    ingest_job_retention: int = 7 * 86400  # finished jobs (and their results) are forgotten after this
+    analysis_cache_ttl: int = 600
+    analysis_cache_max_entries: int = 512
+    analysis_cache_similarity_enabled: bool = False  # costs one embedding call per cache miss
+    analysis_cache_similarity_threshold: float = 0.95
+    query_parser_confidence_threshold: float = 0.7  # below this the local classifier defers to Gemini
     frontend_url: str = "http://localhost:3000"
     websocket_url: str = "ws://localhost:8000"
     qdrant_url: str = "http://localhost:6333"
+    qdrant_upsert_batch_size: int = 256
+    qdrant_upsert_concurrency: int = 4
+    qdrant_upsert_retries: int = 3
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 15.0
 
     class Config:
         env_file = ".env"
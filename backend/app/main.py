@@ -3,6 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.routes import auth, stock_query, pdf, cart, trade, admin, websocket
 from app.database import engine, Base
 from app.config import settings
+from app.services.http_client import init_http_client, close_http_client
+from app.services.ingestion import ingestion_queue
+from app.services.pdf_processor import shutdown_extract_pool
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
@@ -58,7 +61,14 @@ app.include_router(websocket.router, tags=["WebSocket Endpoints"])
 @app.on_event("startup")
 async def startup_event():
     # Initialize any startup tasks
-    pass
+    await init_http_client()
+    await ingestion_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestion_queue.stop()
+    shutdown_extract_pool()
+    await close_http_client()
 
 @app.get("/")
 async def root():
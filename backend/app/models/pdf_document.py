@@ -1,14 +1,23 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.dialects.postgresql import VECTOR
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, DateTime
+from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.database import Base
 
 class PDFDocument(Base):
+    """An ingested PDF, keyed by the sha256 of its bytes; chunk vectors live in Qdrant"""
     __tablename__ = "pdf_documents"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    doc_id = Column(String, unique=True, index=True, nullable=False)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # first uploader
     filename = Column(String, nullable=False)
-    text_content = Column(String, nullable=False)
-    embedding = Column(VECTOR(384))  # Assuming 384-dim embeddings from sentence-transformers
+    title = Column(String, nullable=True)
+    num_pages = Column(Integer, nullable=False)
+    file_size_kb = Column(Float, nullable=False)
+    metadata_json = Column(Text, nullable=False)  # DocumentMetadata
+    analysis_json = Column(Text, nullable=False)  # DocumentAnalysis
+    chunk_ids = Column(Text, nullable=False)  # JSON list of chunk ids stored in Qdrant
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
-    user = relationship("User", back_populates="pdf_documents")
\ No newline at end of file
+    user = relationship("User", back_populates="pdf_documents")
@@ -7,6 +7,9 @@ from app.models.activity_log import ActivityLog
 from app.schemas.user import UserCreate, UserOut
 from app.schemas.trade_request import TradeRequestOut
 from app.dependencies import get_admin_user
+from app.services.alphavantage import get_alpha_vantage_stats
+from app.services.gemini import get_gemini_stats
+from app.services.analysis_cache import get_analysis_cache_stats
 from typing import List
 
 router = APIRouter()
@@ -167,4 +170,15 @@ async def get_activity_logs(
     db: Session = Depends(get_db)
 ):
     logs = db.query(ActivityLog).all()
-    return [{"id": log.id, "user_id": log.user_id, "action": log.action, "timestamp": log.timestamp} for log in logs]
\ No newline at end of file
+    return [{"id": log.id, "user_id": log.user_id, "action": log.action, "timestamp": log.timestamp} for log in logs]
+
+@router.get("/metrics", response_model=dict)
+async def get_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    """Runtime counters for outbound market-data and LLM traffic"""
+    return {
+        "alphavantage": get_alpha_vantage_stats(),
+        "gemini": get_gemini_stats(),
+        "analysis_cache": get_analysis_cache_stats()
+    }
\ No newline at end of file
@@ -8,7 +8,7 @@ from app.dependencies import get_current_user, get_client_user
 from app.models.user import User
 from app.models.trade_request import TradeRequest
 from app.models.activity_log import ActivityLog
-from app.services.alphavantage import fetch_stock_data
+from app.services.alphavantage import fetch_stock_data_batch
 
 router = APIRouter()
 
@@ -100,15 +100,21 @@ async def get_stocks_by_user_id(
         if not holdings:
             return []
         
+        # Fetch current prices from Alpha Vantage for all holdings concurrently; valuation
+        # only needs the quote and the company name, so skip the other endpoints
+        stocks = {
+            stock.symbol: stock
+            async for stock in fetch_stock_data_batch(holdings.keys(), fields={"current_price", "name"})
+        }
+        
         # Get current prices and build response
         result = []
         for symbol, data in holdings.items():
-            try:
-                # Fetch current stock data from Alpha Vantage
-                stock_data = await fetch_stock_data(symbol)
+            stock_data = stocks.get(symbol.strip())
+            if stock_data:
                 current_price = stock_data.current_price
                 name = stock_data.name
-            except Exception as e:
+            else:
                 # Fallback if API call fails
                 current_price = data["total_cost"] / data["quantity"] if data["quantity"] > 0 else 0
                 name = f"{symbol} Inc."
@@ -1,51 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.schemas.pdf_document import DocumentUploadResponse, DocumentQuery, DocumentQueryResponse, QueryType
-from app.services.pdf_processor import extract_text_from_pdf, extract_metadata_from_pdf, chunk_document, generate_embedding, store_in_vector_db, analyze_document
-from app.services.gemini import search_vector_db, detect_query_type, analyze_with_gemini
+from app.schemas.pdf_document import IngestionJob, DocumentQuery, DocumentQueryResponse, QueryType
+from app.services.ingestion import ingestion_queue
+from app.services.uploads import spool_upload
+from app.services.gemini import search_vector_db, detect_query_type, analyze_with_gemini, stream_with_gemini
+from app.services.streaming import sse_event, sse_response
+from app.services.concurrency import Priority, llm_context, request_queue_wait
 from app.dependencies import get_client_user
 from app.models.user import User
 from app.models.activity_log import ActivityLog
 from datetime import datetime
+from typing import List, Optional, Tuple
 
 router = APIRouter()
 
-@router.post("/upload", response_model=DocumentUploadResponse)
+@router.post("/upload", response_model=IngestionJob, status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     document_name: str = Form(None),
     current_user: User = Depends(get_client_user),
     db: Session = Depends(get_db)
 ):
+    """Queue a PDF for ingestion; poll /jobs/{job_id} for progress and the analysis.
+
+    Uploads are deduplicated by content across all users. Re-uploading an ingested
+    file returns a completed job marked duplicate, and an upload identical to one
+    still processing completes with that job's result. Either way the doc_id, chunks
+    and analysis are shared with the first upload; only the filename and title in
+    the response are this upload's (search results keep the first upload's title).
+    """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Extract metadata
-        metadata = await extract_metadata_from_pdf(file_content, file.filename)
-        
-        # Override title if provided
-        if document_name:
-            metadata.title = document_name
-        
-        # Extract text by page
-        pages = await extract_text_from_pdf(file_content)
-        
-        # Chunk document for embedding
-        chunks = await chunk_document(pages, metadata.doc_id)
-        
-        # Store in vector database
-        embedding_ids = await store_in_vector_db(chunks, metadata.doc_id, metadata)
-        
-        # Combine all text for analysis
-        full_text = "\n\n".join([page["text"] for page in pages])
-        
-        # Analyze document
-        analysis = await analyze_document(full_text, metadata)
+        # Streamed to disk in chunks; oversized uploads are rejected before they are fully read
+        upload_path, _, content_hash = await spool_upload(file)
+        # A file that was ingested before comes back as an already completed job
+        job = ingestion_queue.submit(current_user.id, file.filename, document_name, upload_path, content_hash)
         
         # Log activity
         db_log = ActivityLog(
@@ -56,161 +48,222 @@ async def upload_pdf(
         db.add(db_log)
         db.commit()
         
-        return DocumentUploadResponse(
-            doc_id=metadata.doc_id,
-            filename=metadata.filename,
-            analysis=analysis,
-            metadata=metadata
-        )
+        return job
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _get_job(job_id: str, user: User) -> IngestionJob:
+    job = ingestion_queue.get(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs", response_model=List[IngestionJob])
+async def list_jobs(current_user: User = Depends(get_client_user)):
+    return ingestion_queue.list_for_user(current_user.id)
+
+@router.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_job(job_id: str, current_user: User = Depends(get_client_user)):
+    return _get_job(job_id, current_user)
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestionJob, status_code=202)
+async def retry_job(job_id: str, current_user: User = Depends(get_client_user)):
+    """Requeue a failed job; stages it already finished are not repeated"""
+    return ingestion_queue.retry(_get_job(job_id, current_user))
+
+def _log_query(db: Session, user: User, query: str):
+    db_log = ActivityLog(
+        user_id=user.id,
+        action=f"PDF query: {query}",
+        timestamp=datetime.utcnow()
+    )
+    db.add(db_log)
+    db.commit()
+
+async def _prepare_pdf_query(query_data: DocumentQuery) -> Tuple[DocumentQueryResponse, Optional[str]]:
+    """Classify the query, retrieve the relevant chunks and build the answer prompt.
+
+    Returns the response without its text and the prompt that produces it, or a
+    complete response and None when there is nothing to ask Gemini.
+    """
+    # Auto-detect query type if not specified
+    if not query_data.query_type:
+        detected_type = await detect_query_type(query_data.query, "pdf" if query_data.doc_id else None)
+        # Map the string result to the actual enum
+        if detected_type == "SPECIFIC":
+            query_data.query_type = QueryType.SPECIFIC
+        elif detected_type == "COMPARATIVE":
+            query_data.query_type = QueryType.COMPARATIVE
+        else:
+            query_data.query_type = QueryType.GENERAL
+    
+    # Process based on query type
+    if query_data.query_type == QueryType.SPECIFIC and query_data.doc_id:
+        # Search vector DB for relevant chunks
+        relevant_chunks = await search_vector_db(query_data.query, "documents", query_data.doc_id)
+        
+        if not relevant_chunks:
+            return DocumentQueryResponse(
+                query=query_data.query,
+                response="No relevant information found in the document.",
+                doc_id=query_data.doc_id,
+                query_type=QueryType.SPECIFIC
+            ), None
+        
+        # Prepare context from chunks
+        context = "\n\n".join([f"Page {chunk['page_num']}:\n{chunk['text']}" for chunk in relevant_chunks])
+        
+        # Analyze with Gemini
+        analysis_prompt = f"""
+        Based on the following excerpts from document ID {query_data.doc_id}, please answer this query:
+        
+        Query: {query_data.query}
+        
+        Document excerpts:
+        {context}
+        
+        Provide a detailed answer based solely on the information provided in these excerpts.
+        Include relevant quotes or page numbers where applicable.
+        
+        If the document excerpts don't contain enough information to answer the query fully,
+        acknowledge this limitation in your response.
+        """
+        
+        return DocumentQueryResponse(
+            query=query_data.query,
+            response="",
+            doc_id=query_data.doc_id,
+            query_type=QueryType.SPECIFIC,
+            source_chunks=relevant_chunks
+        ), analysis_prompt
+    
+    elif query_data.query_type == QueryType.COMPARATIVE:
+        # Search across all documents or specified documents
+        relevant_chunks = await search_vector_db(query_data.query, "documents", query_data.doc_id, limit=10)
+        
+        if not relevant_chunks:
+            return DocumentQueryResponse(
+                query=query_data.query,
+                response="No relevant information found for comparison.",
+                doc_id=query_data.doc_id,
+                query_type=QueryType.COMPARATIVE
+            ), None
+        
+        # Group chunks by document
+        docs = {}
+        for chunk in relevant_chunks:
+            doc_id = chunk["doc_id"]
+            if doc_id not in docs:
+                docs[doc_id] = []
+            docs[doc_id].append(chunk)
+        
+        # Prepare context for comparison
+        comparison_context = ""
+        for doc_id, chunks in docs.items():
+            doc_info = f"Document: {chunks[0]['title'] or chunks[0]['filename'] or doc_id}\n"
+            doc_context = "\n".join([f"Page {c['page_num']}:\n{c['text']}" for c in chunks])
+            comparison_context += f"{doc_info}{doc_context}\n\n{'='*50}\n\n"
+        
+        # Analyze with Gemini
+        analysis_prompt = f"""
+        Compare the following document excerpts to answer this query:
+        
+        Query: {query_data.query}
+        
+        Document excerpts:
+        {comparison_context}
+        
+        Provide a detailed comparison based on the information provided in these excerpts.
+        Include relevant quotes or page numbers to support your analysis.
+        
+        Structure your answer to clearly identify similarities and differences between 
+        the documents or sections being compared.
+        """
+        
+        return DocumentQueryResponse(
+            query=query_data.query,
+            response="",
+            doc_id=query_data.doc_id,
+            query_type=QueryType.COMPARATIVE,
+            source_chunks=relevant_chunks
+        ), analysis_prompt
+    
+    else:  # GENERAL query
+        # Use Gemini without specific document context
+        prompt = f"""
+        You are a document analysis expert. Answer this question about document analysis:
+        
+        {query_data.query}
+        
+        Provide a detailed but concise response with factual information.
+        If the question is about analyzing financial documents specifically:
+        1. Mention common sections of financial reports to look for
+        2. Explain key metrics or terminology that might be relevant
+        3. Suggest approaches for extracting valuable insights
+        
+        Format your response in a clear, easy-to-read structure with bullet points 
+        or numbered lists where appropriate.
+        """
+        
+        return DocumentQueryResponse(
+            query=query_data.query,
+            response="",
+            doc_id=query_data.doc_id,
+            query_type=QueryType.GENERAL
+        ), prompt
+
 @router.post("/query", response_model=DocumentQueryResponse)
 async def query_pdf(
     query_data: DocumentQuery,
+    response: Response,
     current_user: User = Depends(get_client_user),
     db: Session = Depends(get_db)
 ):
     try:
-        # Log activity
-        db_log = ActivityLog(
-            user_id=current_user.id,
-            action=f"PDF query: {query_data.query}",
-            timestamp=datetime.utcnow()
-        )
-        db.add(db_log)
-        db.commit()
+        _log_query(db, current_user, query_data.query)
+        with llm_context(current_user.id, Priority.INTERACTIVE):
+            result, prompt = await _prepare_pdf_query(query_data)
+            if prompt is not None:
+                result.response = await analyze_with_gemini(prompt)
+            response.headers["X-LLM-Queue-Wait"] = f"{request_queue_wait():.3f}"
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Auto-detect query type if not specified
-        if not query_data.query_type:
-            detected_type = await detect_query_type(query_data.query, "pdf" if query_data.doc_id else None)
-            # Map the string result to the actual enum
-            if detected_type == "SPECIFIC":
-                query_data.query_type = QueryType.SPECIFIC
-            elif detected_type == "COMPARATIVE":
-                query_data.query_type = QueryType.COMPARATIVE
-            else:
-                query_data.query_type = QueryType.GENERAL
-        
-        # Process based on query type
-        if query_data.query_type == QueryType.SPECIFIC and query_data.doc_id:
-            # Search vector DB for relevant chunks
-            relevant_chunks = await search_vector_db(query_data.query, "documents", query_data.doc_id)
-            
-            if not relevant_chunks:
-                return DocumentQueryResponse(
-                    query=query_data.query,
-                    response="No relevant information found in the document.",
-                    doc_id=query_data.doc_id,
-                    query_type=QueryType.SPECIFIC
-                )
-            
-            # Prepare context from chunks
-            context = "\n\n".join([f"Page {chunk['page_num']}:\n{chunk['text']}" for chunk in relevant_chunks])
-            
-            # Analyze with Gemini
-            analysis_prompt = f"""
-            Based on the following excerpts from document ID {query_data.doc_id}, please answer this query:
-            
-            Query: {query_data.query}
-            
-            Document excerpts:
-            {context}
-            
-            Provide a detailed answer based solely on the information provided in these excerpts.
-            Include relevant quotes or page numbers where applicable.
-            
-            If the document excerpts don't contain enough information to answer the query fully,
-            acknowledge this limitation in your response.
-            """
-            
-            analysis = await analyze_with_gemini(analysis_prompt)
-            
-            return DocumentQueryResponse(
-                query=query_data.query,
-                response=analysis,
-                doc_id=query_data.doc_id,
-                query_type=QueryType.SPECIFIC,
-                source_chunks=relevant_chunks
-            )
-        
-        elif query_data.query_type == QueryType.COMPARATIVE:
-            # Search across all documents or specified documents
-            relevant_chunks = await search_vector_db(query_data.query, "documents", query_data.doc_id, limit=10)
-            
-            if not relevant_chunks:
-                return DocumentQueryResponse(
-                    query=query_data.query,
-                    response="No relevant information found for comparison.",
-                    doc_id=query_data.doc_id,
-                    query_type=QueryType.COMPARATIVE
-                )
-            
-            # Group chunks by document
-            docs = {}
-            for chunk in relevant_chunks:
-                doc_id = chunk["doc_id"]
-                if doc_id not in docs:
-                    docs[doc_id] = []
-                docs[doc_id].append(chunk)
-            
-            # Prepare context for comparison
-            comparison_context = ""
-            for doc_id, chunks in docs.items():
-                doc_info = f"Document: {chunks[0]['title'] or chunks[0]['filename'] or doc_id}\n"
-                doc_context = "\n".join([f"Page {c['page_num']}:\n{c['text']}" for c in chunks])
-                comparison_context += f"{doc_info}{doc_context}\n\n{'='*50}\n\n"
-            
-            # Analyze with Gemini
-            analysis_prompt = f"""
-            Compare the following document excerpts to answer this query:
-            
-            Query: {query_data.query}
-            
-            Document excerpts:
-            {comparison_context}
-            
-            Provide a detailed comparison based on the information provided in these excerpts.
-            Include relevant quotes or page numbers to support your analysis.
-            
-            Structure your answer to clearly identify similarities and differences between 
-            the documents or sections being compared.
-            """
-            
-            analysis = await analyze_with_gemini(analysis_prompt)
-            
-            return DocumentQueryResponse(
-                query=query_data.query,
-                response=analysis,
-                doc_id=query_data.doc_id,
-                query_type=QueryType.COMPARATIVE,
-                source_chunks=relevant_chunks
-            )
-        
-        else:  # GENERAL query
-            # Use Gemini without specific document context
-            prompt = f"""
-            You are a document analysis expert. Answer this question about document analysis:
-            
-            {query_data.query}
-            
-            Provide a detailed but concise response with factual information.
-            If the question is about analyzing financial documents specifically:
-            1. Mention common sections of financial reports to look for
-            2. Explain key metrics or terminology that might be relevant
-            3. Suggest approaches for extracting valuable insights
-            
-            Format your response in a clear, easy-to-read structure with bullet points 
-            or numbered lists where appropriate.
-            """
-            
-            analysis = await analyze_with_gemini(prompt)
-            
-            return DocumentQueryResponse(
-                query=query_data.query,
-                response=analysis,
-                doc_id=query_data.doc_id,
-                query_type=QueryType.GENERAL
-            )
+@router.post("/query/stream")
+async def query_pdf_stream(
+    query_data: DocumentQuery,
+    current_user: User = Depends(get_client_user),
+    db: Session = Depends(get_db)
+):
+    """Streaming /query over Server-Sent Events.
+
+    Sends a `data` event with the query type and source chunks, then `token`
+    events as Gemini generates the answer, then `done`.
+    """
+    try:
+        _log_query(db, current_user, query_data.query)
+        with llm_context(current_user.id, Priority.INTERACTIVE):
+            result, prompt = await _prepare_pdf_query(query_data)
+            prepare_wait = request_queue_wait()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        yield sse_event("data", result.model_dump(mode="json", exclude={"response"}))
+        with llm_context(current_user.id, Priority.INTERACTIVE):
+            try:
+                if prompt is None:
+                    yield sse_event("token", {"text": result.response})
+                else:
+                    async for text in stream_with_gemini(prompt):
+                        yield sse_event("token", {"text": text})
+            except Exception as e:
+                # Headers are already sent, so errors are reported in-band
+                yield sse_event("error", {"detail": getattr(e, "detail", str(e))})
+                return
+            yield sse_event("done", {"queue_wait_seconds": round(prepare_wait + request_queue_wait(), 3)})
+
+    return sse_response(events())
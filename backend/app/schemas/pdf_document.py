@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from enum import Enum
+from datetime import datetime
 
 class QueryType(str, Enum):
     SPECIFIC = "specific"
@@ -36,6 +37,8 @@ class DocumentUploadResponse(BaseModel):
     filename: str
     analysis: DocumentAnalysis
     metadata: DocumentMetadata
+    chunk_ids: List[str] = []
+    duplicate: bool = False  # the same file was ingested before and its results reused
 
 class DocumentQuery(BaseModel):
     query: str
@@ -47,4 +50,32 @@ class DocumentQueryResponse(BaseModel):
     response: str
     doc_id: Optional[str] = None
     query_type: QueryType
-    source_chunks: Optional[List[Dict[str, Any]]] = None
\ No newline at end of file
+    source_chunks: Optional[List[Dict[str, Any]]] = None
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class IngestionStage(BaseModel):
+    name: str
+    status: str = "pending"  # pending, running or done
+    done: int = 0
+    total: int = 0
+
+class IngestionJob(BaseModel):
+    job_id: str
+    user_id: int
+    filename: str
+    document_name: Optional[str] = None
+    content_hash: Optional[str] = None
+    status: JobStatus = JobStatus.QUEUED
+    stage: Optional[str] = None
+    stages: List[IngestionStage] = []
+    progress: float = 0.0
+    doc_id: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[DocumentUploadResponse] = None
+    created_at: datetime
+    updated_at: datetime
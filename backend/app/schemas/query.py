@@ -20,12 +20,20 @@ class StockData(BaseModel):
     high_52week: Optional[float] = None
     low_52week: Optional[float] = None
     additional_data: Optional[Dict[str, Any]] = None
+    stale: bool = False  # True when some sections are last known good values served during an upstream outage
+    stale_sections: Optional[List[str]] = None
 
 class StockQuery(BaseModel):
     query: str
     query_type: QueryType = QueryType.GENERAL
     symbols: Optional[List[str]] = None
 
+class QueryPlan(BaseModel):
+    query_type: QueryType
+    symbols: List[str] = []
+    metrics: List[str] = []  # StockData fields the user asked about, used to focus the analysis
+    source: str = "local"  # "local" when the rule-based parser was enough, "llm" when the planner call was made
+
 class StockResponse(BaseModel):
     query: Optional[str] = None
     response: Optional[str] = None
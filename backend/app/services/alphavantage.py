@@ -1,139 +1,472 @@
-import httpx
-import pandas as pd
-from datetime import datetime, timedelta
+import asyncio
+import time
+import numpy as np
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from fastapi import HTTPException
 from app.config import settings
 from app.schemas.query import StockData
-from typing import Dict, Any, Optional
+from app.services.cache import TTLCache
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.http_client import get_http_client
+from app.services.indicators import latest_snapshot, stack_series
+from app.services.price_store import PriceStore, adjusted_prices, has_split_after, parse_daily_series
+from app.services.rate_limiter import TokenBucket, SingleFlight
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable, AsyncIterator, Set, Awaitable
 
-async def fetch_alpha_vantage_data(function: str, symbol: str, **kwargs) -> Optional[Dict[str, Any]]:
-    """Fetch data from Alpha Vantage API for a specific function and symbol"""
+# A section loader returns the parsed fields and whether they are a stale fallback
+SectionLoader = Callable[[str], Awaitable[Tuple[Dict[str, Any], bool]]]
+
+# Cache TTL per Alpha Vantage function: quotes move by the second, technicals and
+# news by the hour, and fundamentals at most once a quarter. Daily price history is
+# not cached here; it is kept incrementally in the local price store instead.
+ALPHA_VANTAGE_TTLS = {
+    "GLOBAL_QUOTE": settings.alphavantage_quote_ttl,
+    "NEWS_SENTIMENT": settings.alphavantage_indicator_ttl,
+    "OVERVIEW": settings.alphavantage_fundamentals_ttl,
+    "INCOME_STATEMENT": settings.alphavantage_fundamentals_ttl,
+    "BALANCE_SHEET": settings.alphavantage_fundamentals_ttl,
+}
+
+alpha_vantage_cache = TTLCache(
+    max_entries=settings.alphavantage_cache_max_entries,
+    path=settings.alphavantage_cache_path or None,
+    name="alphavantage",
+    stale_ttl=settings.alphavantage_stale_ttl
+)
+
+alpha_vantage_limiter = TokenBucket(settings.alphavantage_requests_per_minute, settings.alphavantage_burst)
+alpha_vantage_flights = SingleFlight()
+alpha_vantage_stats = {
+    "upstream_requests": 0, "throttled": 0, "coalesced": 0, "errors": 0,
+    "short_circuited": 0, "stale_served": 0, "revalidations": 0
+}
+alpha_vantage_breakers: Dict[str, CircuitBreaker] = defaultdict(lambda: CircuitBreaker(
+    settings.alphavantage_breaker_failure_threshold, settings.alphavantage_breaker_reset_timeout
+))
+_revalidations: Dict[str, asyncio.Task] = {}
+
+price_store = PriceStore(settings.price_store_path)
+_price_syncs = SingleFlight()
+_price_synced_at: Dict[str, float] = {}  # last successful sync, for the refresh interval
+_price_sync_ok: Dict[str, bool] = {}  # outcome of the latest sync attempt, for the stale flag
+
+def _cache_key(function: str, symbol: str, **kwargs) -> str:
+    params = "&".join(f"{key}={kwargs[key]}" for key in sorted(kwargs))
+    return f"{function}:{symbol.upper()}:{params}"
+
+def _is_error_payload(payload: Dict[str, Any]) -> bool:
+    # Alpha Vantage reports quota and lookup errors with HTTP 200 and one of these keys
+    return not payload or any(key in payload for key in ("Note", "Information", "Error Message"))
+
+def _is_quota_payload(payload: Dict[str, Any]) -> bool:
+    return "Note" in payload or "Information" in payload
+
+async def _request_alpha_vantage(function: str, symbol: str, **kwargs) -> Dict[str, Any]:
+    params = {"function": function, "symbol": symbol, "apikey": settings.alphavantage_api_key, **kwargs}
+
+    response = await get_http_client().get(settings.alphavantage_base_url, params=params)
+    response.raise_for_status()
+    return response.json()
+
+async def _fetch_and_cache(key: str, function: str, symbol: str, **kwargs) -> Optional[Dict[str, Any]]:
+    breaker = alpha_vantage_breakers[function]
+    if not breaker.allow():
+        alpha_vantage_stats["short_circuited"] += 1
+        return None
+    if await alpha_vantage_limiter.acquire():
+        alpha_vantage_stats["throttled"] += 1
+    alpha_vantage_stats["upstream_requests"] += 1
     try:
-        base_url = "https://www.alphavantage.co/query"
-        params = {"function": function, "symbol": symbol, "apikey": settings.alphavantage_api_key, **kwargs}
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(base_url, params=params)
-            response.raise_for_status()
-            return response.json()
+        # Only the request itself is timed: waiting for a token is throttling, not a failure
+        payload = await asyncio.wait_for(
+            _request_alpha_vantage(function, symbol, **kwargs), timeout=settings.alphavantage_section_timeout
+        )
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        alpha_vantage_stats["errors"] += 1
+        print(f"Timed out fetching {function} for {symbol}")
+        return None
     except Exception as e:
+        breaker.record_failure()
+        alpha_vantage_stats["errors"] += 1
         print(f"Error fetching {function} for {symbol}: {str(e)}")
         return None
+    if not payload or _is_quota_payload(payload):
+        # Over quota or an empty reply counts against the upstream, not the symbol
+        breaker.record_failure()
+        alpha_vantage_stats["errors"] += 1
+        return None
+    breaker.record_success()
+    if _is_error_payload(payload):
+        alpha_vantage_stats["errors"] += 1
+    elif function in ALPHA_VANTAGE_TTLS:
+        alpha_vantage_cache.set(key, payload, ALPHA_VANTAGE_TTLS[function])
+    return payload
 
-async def fetch_stock_data(symbol: str) -> StockData:
-    """Collect comprehensive stock data from multiple Alpha Vantage endpoints"""
-    try:
-        data = {}
-
-        # 1. Get basic quote data (original implementation)
-        quote_data = await fetch_alpha_vantage_data("GLOBAL_QUOTE", symbol)
-        if quote_data and "Global Quote" in quote_data and quote_data["Global Quote"]:
-            quote = quote_data["Global Quote"]
-            data["current_price"] = float(quote.get("05. price", 0))
-            data["change_percent"] = float(quote.get("10. change percent", "0%").replace("%", ""))
-            data["volume"] = int(quote.get("06. volume", 0)) if quote.get("06. volume") else None
-            
-            # Additional quote data
-            data["open"] = float(quote.get("02. open", 0)) if quote.get("02. open") else None
-            data["high"] = float(quote.get("03. high", 0)) if quote.get("03. high") else None
-            data["low"] = float(quote.get("04. low", 0)) if quote.get("04. low") else None
-        
-        # 2. Company Overview (fundamentals)
-        overview = await fetch_alpha_vantage_data("OVERVIEW", symbol)
-        if overview:
-            data["name"] = overview.get("Name", symbol)
-            data["pe_ratio"] = float(overview.get("PERatio", 0) or 0)
-            data["eps"] = float(overview.get("EPS", 0) or 0)
-            data["dividend_yield"] = float(overview.get("DividendYield", 0) or 0)
-            data["beta"] = float(overview.get("Beta", 0) or 0)
-            data["market_cap"] = int(overview.get("MarketCapitalization", 0) or 0)
-        
-        # 3. Income Statement (Revenue Growth)
-        income = await fetch_alpha_vantage_data("INCOME_STATEMENT", symbol)
-        if income and "annualReports" in income and len(income["annualReports"]) >= 2:
-            revenue_t0 = int(income["annualReports"][0].get("totalRevenue", 0) or 0)
-            revenue_t1 = int(income["annualReports"][1].get("totalRevenue", 0) or 0)
-            data["revenue_growth"] = (revenue_t0 - revenue_t1) / revenue_t1 if revenue_t1 else 0
-        
-        # 4. Balance Sheet (Debt-to-Equity)
-        balance = await fetch_alpha_vantage_data("BALANCE_SHEET", symbol)
-        if balance and "annualReports" in balance and balance["annualReports"]:
-            total_debt = int(balance["annualReports"][0].get("totalLiabilities", 0) or 0)
-            equity = int(balance["annualReports"][0].get("totalShareholderEquity", 0) or 0)
-            data["debt_to_equity"] = total_debt / equity if equity else 0
-        
-        # 5. Price Data (TIME_SERIES_DAILY_ADJUSTED for technical indicators)
-        prices = await fetch_alpha_vantage_data("TIME_SERIES_DAILY_ADJUSTED", symbol, outputsize="compact")
-        if prices and "Time Series (Daily)" in prices:
-            # Convert to DataFrame for easier processing
-            df = pd.DataFrame.from_dict(prices["Time Series (Daily)"]).T
-            df = df[["4. close", "5. volume"]].astype(float)
-            
-            # Calculate technical indicators
-            data["high_52week"] = df["4. close"].max()
-            data["low_52week"] = df["4. close"].min()
-            data["30d_high"] = df["4. close"].head(30).max()
-            data["30d_low"] = df["4. close"].head(30).min()
-            data["50d_sma"] = df["4. close"].head(50).mean()
-        
-        # 6. Technical Indicator (RSI)
-        rsi = await fetch_alpha_vantage_data("RSI", symbol, interval="daily", time_period=14, series_type="close")
-        if rsi and "Technical Analysis: RSI" in rsi:
-            latest_date = max(rsi["Technical Analysis: RSI"].keys())
-            data["rsi"] = float(rsi["Technical Analysis: RSI"][latest_date]["RSI"])
-        
-        # 7. News Sentiment
-        sentiment = await fetch_alpha_vantage_data(
-            "NEWS_SENTIMENT", 
-            symbol, 
+def _schedule_revalidation(key: str, function: str, symbol: str, **kwargs):
+    """Refresh a stale entry in the background once the function's circuit lets a probe through"""
+    if key in _revalidations:
+        return
+
+    async def revalidate():
+        try:
+            await asyncio.sleep(alpha_vantage_breakers[function].retry_in())
+            alpha_vantage_stats["revalidations"] += 1
+            await alpha_vantage_flights.do(key, lambda: _fetch_and_cache(key, function, symbol, **kwargs))
+        finally:
+            _revalidations.pop(key, None)
+
+    _revalidations[key] = asyncio.create_task(revalidate())
+
+async def fetch_alpha_vantage_entry(function: str, symbol: str, **kwargs) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Fetch (payload, stale) for a function and symbol.
+
+    Fresh cache entries are returned as is. While the function's circuit is open, or
+    when the upstream call fails, the last known good value is returned with
+    stale=True instead of blocking on or surfacing the failure.
+    """
+    key = _cache_key(function, symbol, **kwargs)
+    cacheable = function in ALPHA_VANTAGE_TTLS
+    cached = alpha_vantage_cache.get(key) if cacheable else None
+    if cached is not None:
+        return cached, False
+
+    stale = alpha_vantage_cache.get_stale(key) if cacheable else None
+    if stale is not None and alpha_vantage_breakers[function].state != CircuitBreaker.CLOSED:
+        _schedule_revalidation(key, function, symbol, **kwargs)
+        alpha_vantage_stats["stale_served"] += 1
+        return stale[0], True
+
+    # Identical in-flight requests share one rate-limited upstream call
+    payload, shared = await alpha_vantage_flights.do(
+        key, lambda: _fetch_and_cache(key, function, symbol, **kwargs)
+    )
+    if shared:
+        alpha_vantage_stats["coalesced"] += 1
+    if payload is None and stale is not None:
+        alpha_vantage_stats["stale_served"] += 1
+        return stale[0], True
+    return payload, False
+
+async def fetch_alpha_vantage_data(function: str, symbol: str, **kwargs) -> Optional[Dict[str, Any]]:
+    """Fetch data from Alpha Vantage API for a specific function and symbol, served from cache while fresh"""
+    payload, _ = await fetch_alpha_vantage_entry(function, symbol, **kwargs)
+    return payload
+
+def get_alpha_vantage_stats() -> Dict[str, Any]:
+    return {
+        **alpha_vantage_stats,
+        "in_flight": alpha_vantage_flights.in_flight(),
+        "cache": alpha_vantage_cache.stats(),
+        "breakers": {
+            function: {"state": breaker.state, "failures": breaker.failures}
+            for function, breaker in alpha_vantage_breakers.items()
+        },
+    }
+
+def _parse_quote(payload: Dict[str, Any]) -> Dict[str, Any]:
+    data = {}
+    if "Global Quote" in payload and payload["Global Quote"]:
+        quote = payload["Global Quote"]
+        data["current_price"] = float(quote.get("05. price", 0))
+        data["change_percent"] = float(quote.get("10. change percent", "0%").replace("%", ""))
+        data["volume"] = int(quote.get("06. volume", 0)) if quote.get("06. volume") else None
+        data["open"] = float(quote.get("02. open", 0)) if quote.get("02. open") else None
+        data["high"] = float(quote.get("03. high", 0)) if quote.get("03. high") else None
+        data["low"] = float(quote.get("04. low", 0)) if quote.get("04. low") else None
+    return data
+
+def _parse_overview(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": payload.get("Name", payload.get("Symbol")),
+        "pe_ratio": float(payload.get("PERatio", 0) or 0),
+        "eps": float(payload.get("EPS", 0) or 0),
+        "dividend_yield": float(payload.get("DividendYield", 0) or 0),
+        "beta": float(payload.get("Beta", 0) or 0),
+        "market_cap": int(payload.get("MarketCapitalization", 0) or 0),
+    }
+
+def _parse_income_statement(payload: Dict[str, Any]) -> Dict[str, Any]:
+    data = {}
+    if "annualReports" in payload and len(payload["annualReports"]) >= 2:
+        revenue_t0 = int(payload["annualReports"][0].get("totalRevenue", 0) or 0)
+        revenue_t1 = int(payload["annualReports"][1].get("totalRevenue", 0) or 0)
+        data["revenue_growth"] = (revenue_t0 - revenue_t1) / revenue_t1 if revenue_t1 else 0
+    return data
+
+def _parse_balance_sheet(payload: Dict[str, Any]) -> Dict[str, Any]:
+    data = {}
+    if "annualReports" in payload and payload["annualReports"]:
+        total_debt = int(payload["annualReports"][0].get("totalLiabilities", 0) or 0)
+        equity = int(payload["annualReports"][0].get("totalShareholderEquity", 0) or 0)
+        data["debt_to_equity"] = total_debt / equity if equity else 0
+    return data
+
+async def sync_price_history(symbol: str) -> np.ndarray:
+    """Bring the local daily history for symbol up to date and return it, oldest first.
+
+    The first sync downloads the full history. Later syncs make one compact request
+    only when a completed trading day is missing, and append just the newer bars.
+    """
+    key = symbol.upper()
+    synced_at = _price_synced_at.get(key)
+    if synced_at is not None and time.monotonic() - synced_at < settings.price_store_refresh_interval:
+        return price_store.load(symbol)
+    bars, _ = await _price_syncs.do(key, lambda: _sync_price_history(symbol))
+    return bars
+
+async def _sync_price_history(symbol: str) -> np.ndarray:
+    last = price_store.last_date(symbol)
+    missing_days = np.busday_count(last + 1, np.datetime64(date.today(), "D")) if last is not None else None
+    key = symbol.upper()
+    if missing_days is not None and missing_days <= 0:
+        _price_synced_at[key] = time.monotonic()
+        _price_sync_ok[key] = True
+        return price_store.load(symbol)
+
+    # The compact series only covers the last 100 trading days
+    outputsize = "compact" if missing_days is not None and missing_days < 100 else "full"
+    payload = await fetch_alpha_vantage_data("TIME_SERIES_DAILY_ADJUSTED", symbol, outputsize=outputsize)
+    ok = bool(payload) and not _is_error_payload(payload)
+    if ok and last is not None and has_split_after(payload, last):
+        # A split changes the adjusted close of every stored bar, so the history is rewritten
+        if outputsize != "full":
+            payload = await fetch_alpha_vantage_data("TIME_SERIES_DAILY_ADJUSTED", symbol, outputsize="full")
+            ok = bool(payload) and not _is_error_payload(payload)
+        if ok:
+            price_store.replace(symbol, parse_daily_series(payload))
+    elif ok:
+        price_store.append(symbol, parse_daily_series(payload))
+    _price_sync_ok[key] = ok
+    if ok:
+        _price_synced_at[key] = time.monotonic()
+    return price_store.load(symbol)
+
+# StockData fields derived from local price history, and the latest_snapshot() indicator behind each
+PRICE_HISTORY_INDICATORS = {
+    "high_52week": "high_252",  # ~252 trading days in 52 weeks
+    "low_52week": "low_252",
+    "30d_high": "high_30",
+    "30d_low": "low_30",
+    "50d_sma": "sma_50",
+    "rsi": "rsi_14",
+}
+# Trailing bars the indicators are computed over: enough for the 252-day range and for
+# the smoothed averages to settle, without looping over decades of stored history
+INDICATOR_HISTORY_DAYS = 300
+
+def _indicator_fields(snapshot: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        field: float(snapshot[indicator])
+        for field, indicator in PRICE_HISTORY_INDICATORS.items()
+        if not np.isnan(snapshot[indicator])
+    }
+
+def _price_history_stats(bars: np.ndarray) -> Dict[str, Any]:
+    if not len(bars):
+        return {}
+    return _indicator_fields(latest_snapshot(*adjusted_prices(bars[-INDICATOR_HISTORY_DAYS:])))
+
+async def fetch_indicator_snapshots(symbols: Iterable[str], history_days: int = INDICATOR_HISTORY_DAYS) -> Dict[str, Dict[str, float]]:
+    """Latest technical indicators for many symbols, computed in one vectorized pass over local history"""
+    symbols = list(dict.fromkeys(symbols))
+    histories = await asyncio.gather(*[sync_price_history(symbol) for symbol in symbols])
+    prices = [adjusted_prices(bars[-history_days:]) for bars in histories]
+    snapshot = latest_snapshot(
+        stack_series([high for high, _, _ in prices], history_days),
+        stack_series([low for _, low, _ in prices], history_days),
+        stack_series([close for _, _, close in prices], history_days)
+    )
+    return {
+        symbol: {name: float(values[i]) for name, values in snapshot.items()}
+        for i, symbol in enumerate(symbols)
+    }
+
+def apply_indicator_snapshot(stock: StockData, snapshot: Dict[str, float], fields: Optional[Iterable[str]] = None) -> StockData:
+    """Fill a StockData's price-history fields (all, or those in fields) from a fetch_indicator_snapshots() entry"""
+    values = _indicator_fields(snapshot)
+    for field in PRICE_HISTORY_INDICATORS if fields is None else set(fields) & PRICE_HISTORY_INDICATORS.keys():
+        if field in ("high_52week", "low_52week"):
+            setattr(stock, field, values.get(field, 0.0))
+        else:
+            stock.additional_data = stock.additional_data or {}
+            stock.additional_data[field] = values.get(field, 0.0)
+    return stock
+
+def _parse_news_sentiment(payload: Dict[str, Any]) -> Dict[str, Any]:
+    data = {}
+    if "feed" in payload:
+        sentiment_scores = [
+            float(item["overall_sentiment_score"])
+            for item in payload["feed"]
+            if "overall_sentiment_score" in item
+        ]
+        data["sentiment_score"] = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
+    return data
+
+# Alpha Vantage function each StockData field (top level or additional_data) is derived from
+FIELD_FUNCTIONS = {
+    "current_price": "GLOBAL_QUOTE",
+    "change_percent": "GLOBAL_QUOTE",
+    "volume": "GLOBAL_QUOTE",
+    "open": "GLOBAL_QUOTE",
+    "high": "GLOBAL_QUOTE",
+    "low": "GLOBAL_QUOTE",
+    "name": "OVERVIEW",
+    "pe_ratio": "OVERVIEW",
+    "eps": "OVERVIEW",
+    "dividend_yield": "OVERVIEW",
+    "beta": "OVERVIEW",
+    "market_cap": "OVERVIEW",
+    "revenue_growth": "INCOME_STATEMENT",
+    "debt_to_equity": "BALANCE_SHEET",
+    "high_52week": "TIME_SERIES_DAILY_ADJUSTED",
+    "low_52week": "TIME_SERIES_DAILY_ADJUSTED",
+    "30d_high": "TIME_SERIES_DAILY_ADJUSTED",
+    "30d_low": "TIME_SERIES_DAILY_ADJUSTED",
+    "50d_sma": "TIME_SERIES_DAILY_ADJUSTED",
+    "rsi": "TIME_SERIES_DAILY_ADJUSTED",
+    "sentiment_score": "NEWS_SENTIMENT",
+}
+
+STOCK_DATA_FIELDS = frozenset(FIELD_FUNCTIONS)
+
+def _api_section(function: str, parser: Callable[[Dict[str, Any]], Dict[str, Any]], **params) -> SectionLoader:
+    async def load(symbol: str) -> Tuple[Dict[str, Any], bool]:
+        payload, stale = await fetch_alpha_vantage_entry(function, symbol, **params)
+        return (parser(payload) if payload else {}), stale
+    return load
+
+async def _load_price_history(symbol: str) -> Tuple[Dict[str, Any], bool]:
+    bars = await sync_price_history(symbol)
+    # Stored bars that the latest sync could not bring up to date are a stale fallback
+    stale = len(bars) > 0 and not _price_sync_ok.get(symbol.upper(), False)
+    # The indicators loop over bars in Python, so keep them off the event loop
+    return await asyncio.to_thread(_price_history_stats, bars), stale
+
+def _stock_data_sections(fields: Optional[Iterable[str]] = None) -> List[Tuple[str, SectionLoader]]:
+    """(function, loader) for every Alpha Vantage section behind the requested fields"""
+    sections = [
+        ("GLOBAL_QUOTE", _api_section("GLOBAL_QUOTE", _parse_quote)),
+        ("OVERVIEW", _api_section("OVERVIEW", _parse_overview)),
+        ("INCOME_STATEMENT", _api_section("INCOME_STATEMENT", _parse_income_statement)),
+        ("BALANCE_SHEET", _api_section("BALANCE_SHEET", _parse_balance_sheet)),
+        ("TIME_SERIES_DAILY_ADJUSTED", _load_price_history),
+        ("NEWS_SENTIMENT", _api_section(
+            "NEWS_SENTIMENT", _parse_news_sentiment,
             time_from=(datetime.now() - timedelta(days=7)).strftime("%Y%m%dT0000")
-        )
-        if sentiment and "feed" in sentiment:
-            sentiment_scores = [
-                float(item["overall_sentiment_score"]) 
-                for item in sentiment["feed"] 
-                if "overall_sentiment_score" in item
-            ]
-            data["sentiment_score"] = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
-        
-        # Construct the StockData object with all the collected data
-        return StockData(
-            symbol=symbol,
-            name=data.get("name", f"{symbol} Inc."),
-            current_price=data.get("current_price", 0.0),
-            change_percent=data.get("change_percent", 0.0),
-            market_cap=data.get("market_cap", 0),
-            pe_ratio=data.get("pe_ratio", 0.0),
-            dividend_yield=data.get("dividend_yield", 0.0),
-            volume=data.get("volume", 0),
-            high_52week=data.get("high_52week", 0.0),
-            low_52week=data.get("low_52week", 0.0),
-            additional_data={
-                "open": data.get("open", 0.0),
-                "high": data.get("high", 0.0),
-                "low": data.get("low", 0.0),
-                "eps": data.get("eps", 0.0),
-                "beta": data.get("beta", 0.0),
-                "revenue_growth": data.get("revenue_growth", 0.0),
-                "debt_to_equity": data.get("debt_to_equity", 0.0),
-                "30d_high": data.get("30d_high", 0.0),
-                "30d_low": data.get("30d_low", 0.0),
-                "50d_sma": data.get("50d_sma", 0.0),
-                "rsi": data.get("rsi", 0.0),
-                "sentiment_score": data.get("sentiment_score", 0.0)
-            }
-        )
-    except Exception as e:
-        print(f"Error fetching comprehensive stock data for {symbol}: {str(e)}")
-        # Fallback to mock data with hash-based values for testing/demo
-        return StockData(
-            symbol=symbol,
-            name=f"{symbol} Inc.",
-            current_price=100.0 + hash(symbol) % 100,
-            change_percent=1.5 + (hash(symbol) % 5),
-            market_cap=1000000000.0 + hash(symbol) % 1000000000,
-            pe_ratio=15.0 + hash(symbol) % 10,
-            dividend_yield=2.5 + (hash(symbol) % 3),
-            volume=1000000 + hash(symbol) % 1000000,
-            high_52week=150.0 + hash(symbol) % 50,
-            low_52week=80.0 + hash(symbol) % 30
-        )
\ No newline at end of file
+        )),
+    ]
+    if fields is None:
+        return sections
+    functions = {FIELD_FUNCTIONS[field] for field in fields if field in FIELD_FUNCTIONS}
+    return [section for section in sections if section[0] in functions]
+
+async def _fetch_section(function: str, symbol: str, load: SectionLoader) -> Tuple[Dict[str, Any], bool]:
+    """Fetch and parse one Alpha Vantage section, returning no fields if it fails to parse.
+
+    Upstream requests are timed individually in _fetch_and_cache, so a section that
+    waits its turn behind the rate limiter is delayed rather than dropped.
+    """
+    try:
+        return await load(symbol)
+    except (KeyError, ValueError, TypeError) as e:
+        print(f"Error parsing {function} for {symbol}: {str(e)}")
+        return {}, False
+
+def _validate_fields(fields: Optional[Iterable[str]]) -> Optional[Set[str]]:
+    if fields is None:
+        return None
+    fields = set(fields)
+    unknown = fields - STOCK_DATA_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown stock data fields: {', '.join(sorted(unknown))}")
+    return fields
+
+def _build_stock_data(
+    symbol: str,
+    data: Dict[str, Any],
+    fields: Optional[Set[str]] = None,
+    stale_sections: Optional[List[str]] = None
+) -> StockData:
+    """Construct the StockData object, leaving fields outside the projection unset"""
+    def value(field: str, default: Any) -> Any:
+        if fields is not None and field not in fields:
+            return None
+        return data.get(field, default)
+
+    additional_fields = ["open", "high", "low", "eps", "beta", "revenue_growth", "debt_to_equity",
+                         "30d_high", "30d_low", "50d_sma", "rsi", "sentiment_score"]
+    return StockData(
+        symbol=symbol,
+        name=data.get("name", f"{symbol} Inc."),
+        current_price=data.get("current_price", 0.0),
+        change_percent=data.get("change_percent", 0.0),
+        market_cap=value("market_cap", 0),
+        pe_ratio=value("pe_ratio", 0.0),
+        dividend_yield=value("dividend_yield", 0.0),
+        volume=value("volume", 0),
+        high_52week=value("high_52week", 0.0),
+        low_52week=value("low_52week", 0.0),
+        additional_data={
+            field: data.get(field, 0.0)
+            for field in additional_fields
+            if fields is None or field in fields
+        },
+        stale=bool(stale_sections),
+        stale_sections=stale_sections or None
+    )
+
+async def fetch_stock_data(symbol: str, fields: Optional[Iterable[str]] = None) -> StockData:
+    """Collect comprehensive stock data from multiple Alpha Vantage endpoints.
+
+    fields is an optional projection over STOCK_DATA_FIELDS: only the endpoints those
+    fields are derived from are called, and the other optional fields are left unset.
+    Portfolio valuation, for example, needs just {"current_price", "name"}.
+
+    Sections served from last known good values are listed in stale_sections. Raises
+    HTTPException(503) when no real quote is available rather than inventing one.
+    """
+    fields = _validate_fields(fields)
+    # Fetch every section concurrently; a slow or failing section only drops its own fields
+    sections = _stock_data_sections(fields)
+    results = await asyncio.gather(*[_fetch_section(function, symbol, load) for function, load in sections])
+    data = {}
+    stale_sections = []
+    for (function, _), (section, stale) in zip(sections, results):
+        data.update({key: value for key, value in section.items() if value is not None})
+        if stale:
+            stale_sections.append(function)
+
+    # Never fabricate a price: without a live or last known quote the data is unavailable
+    if (fields is None or "current_price" in fields) and "current_price" not in data:
+        raise HTTPException(status_code=503, detail=f"Market data for {symbol} is currently unavailable")
+
+    return _build_stock_data(symbol, data, fields, stale_sections)
+
+async def fetch_stock_data_batch(symbols: Iterable[str], fields: Optional[Iterable[str]] = None) -> AsyncIterator[StockData]:
+    """Fetch many symbols with bounded concurrency, yielding each StockData as soon as it completes.
+
+    Duplicate symbols are fetched once, and sub-requests shared between symbols are
+    coalesced by fetch_alpha_vantage_data. Symbols that fail are logged and skipped.
+    """
+    unique_symbols = list(dict.fromkeys(symbol.strip() for symbol in symbols if symbol and symbol.strip()))
+    fields = _validate_fields(fields)
+    semaphore = asyncio.Semaphore(settings.stock_batch_concurrency)
+
+    async def fetch_one(symbol: str) -> StockData:
+        async with semaphore:
+            return await fetch_stock_data(symbol, fields=fields)
+
+    tasks = [asyncio.create_task(fetch_one(symbol)) for symbol in unique_symbols]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                yield await next_done
+            except Exception as e:
+                print(f"Error fetching stock data in batch: {str(e)}")
+    finally:
+        # Stop outstanding fetches if the consumer stops iterating early
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.config import settings
+from app.schemas.query import StockData
+from app.services.cache import TTLCache
+from app.services.gemini import analyze_with_gemini, embed_with_gemini, stream_with_gemini
+from app.services.rate_limiter import SingleFlight
+
+# Gemini analyses are cached by (normalized query, query type, fingerprint of the
+# StockData in the prompt). Because the fingerprint covers the data values, a cached
+# answer is only reused while the figures it was written from are unchanged.
+
+def normalize_query(query: str) -> str:
+    text = re.sub(r"[^\w\s$&.%-]", " ", query.lower())
+    return re.sub(r"\s+", " ", text).strip(" .")
+
+def stock_data_fingerprint(stocks: Sequence[StockData]) -> str:
+    """Hash of the data values that go into the analysis prompt"""
+    snapshot = [stock.model_dump(exclude={"stale", "stale_sections"}) for stock in stocks]
+    return hashlib.sha256(json.dumps(snapshot, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+class AnalysisCache:
+    """TTL/LRU cache of Gemini analyses with an optional embedding-similarity lookup.
+
+    Similar queries only match within the same query type and data fingerprint, so
+    "Is AAPL a buy?" and "should I buy AAPL" can share an answer but never across
+    different stocks or a changed quote.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, similarity_threshold: Optional[float] = None):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._cache = TTLCache(max_entries=max_entries, name="gemini_analysis")
+        # (query type, fingerprint) -> cache key -> unit-length query embedding
+        self._vectors: "OrderedDict[Tuple[str, str], OrderedDict[str, np.ndarray]]" = OrderedDict()
+        self._vector_count = 0
+        self._max_vectors = max_entries
+        self._flights = SingleFlight()
+        self.similar_hits = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(query: str, query_type: str, fingerprint: str) -> str:
+        return f"{query_type}:{fingerprint}:{normalize_query(query)}"
+
+    def _key_for(self, query: str, query_type: str, stocks: Sequence[StockData]) -> Tuple[str, str, str]:
+        query_type = str(getattr(query_type, "value", query_type)).upper()
+        fingerprint = stock_data_fingerprint(stocks)
+        return query_type, fingerprint, self.key(query, query_type, fingerprint)
+
+    async def get_or_analyze(self, query: str, query_type: str, stocks: Sequence[StockData], prompt: str) -> str:
+        query_type, fingerprint, key = self._key_for(query, query_type, stocks)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def analyze() -> str:
+            similar, embedding = await self._similar(query, query_type, fingerprint)
+            if similar is not None:
+                return similar
+            response = await analyze_with_gemini(prompt)
+            self._store(query_type, fingerprint, key, response, embedding)
+            return response
+
+        response, shared = await self._flights.do(key, analyze)
+        if shared:
+            self.coalesced += 1
+        return response
+
+    async def stream(self, query: str, query_type: str, stocks: Sequence[StockData], prompt: str) -> AsyncIterator[str]:
+        """Like get_or_analyze, but yields Gemini output as it is generated. A hit is yielded in one piece."""
+        query_type, fingerprint, key = self._key_for(query, query_type, stocks)
+        cached, embedding = self._cache.get(key), None
+        if cached is None:
+            cached, embedding = await self._similar(query, query_type, fingerprint)
+        if cached is not None:
+            yield cached
+            return
+
+        parts: List[str] = []
+        async for text in stream_with_gemini(prompt):
+            parts.append(text)
+            yield text
+        # Only complete answers are cached; a client disconnect closes this generator before we get here
+        self._store(query_type, fingerprint, key, "".join(parts), embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(
+            similar_hits=self.similar_hits,
+            coalesced=self.coalesced,
+            similarity_enabled=bool(self.similarity_threshold),
+            effective_hit_rate=(stats["hits"] + self.similar_hits + self.coalesced) / lookups if lookups else 0.0,
+        )
+        return stats
+
+    async def _similar(self, query: str, query_type: str, fingerprint: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Cached answer to a near-identical query, plus the query embedding for storing a new answer"""
+        if not self.similarity_threshold:
+            return None, None
+        embedding = await self._embed(query)
+        if embedding is None:
+            return None, None
+        similar = self._find_similar(query_type, fingerprint, embedding)
+        if similar is not None:
+            self.similar_hits += 1
+        return similar, embedding
+
+    def _store(self, query_type: str, fingerprint: str, key: str, response: str, embedding: Optional[np.ndarray]):
+        self._cache.set(key, response, self.ttl)
+        if embedding is not None:
+            self._remember(query_type, fingerprint, key, embedding)
+
+    async def _embed(self, query: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await embed_with_gemini(normalize_query(query), task_type="SEMANTIC_SIMILARITY"), dtype=np.float32)
+        except Exception as e:
+            # Similarity is best effort; an embedding failure just means an exact-key cache
+            print(f"Analysis cache: embedding failed, skipping similarity lookup: {str(e)}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _find_similar(self, query_type: str, fingerprint: str, embedding: np.ndarray) -> Optional[str]:
+        bucket = self._vectors.get((query_type, fingerprint))
+        if not bucket:
+            return None
+        keys: List[str] = list(bucket)
+        scores = np.stack([bucket[k] for k in keys]) @ embedding
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.similarity_threshold:
+                break
+            # get_stale() does not touch the hit/miss counters; with stale_ttl=0 it only returns fresh entries
+            entry = self._cache.get_stale(keys[index])
+            if entry is not None:
+                return entry[0]
+            # Expired or evicted from the response cache; forget the vector too
+            del bucket[keys[index]]
+            self._vector_count -= 1
+        return None
+
+    def _remember(self, query_type: str, fingerprint: str, key: str, embedding: np.ndarray):
+        bucket = self._vectors.setdefault((query_type, fingerprint), OrderedDict())
+        self._vectors.move_to_end((query_type, fingerprint))
+        if key not in bucket:
+            self._vector_count += 1
+        bucket[key] = embedding
+        while self._vector_count > self._max_vectors:
+            oldest_bucket_key, oldest_bucket = next(iter(self._vectors.items()))
+            if oldest_bucket:
+                oldest_bucket.popitem(last=False)
+                self._vector_count -= 1
+            if not oldest_bucket:
+                del self._vectors[oldest_bucket_key]
+
+analysis_cache = AnalysisCache(
+    max_entries=settings.analysis_cache_max_entries,
+    ttl=settings.analysis_cache_ttl,
+    similarity_threshold=settings.analysis_cache_similarity_threshold if settings.analysis_cache_similarity_enabled else None
+)
+
+async def cached_analysis(query: str, query_type: str, stocks: Sequence[StockData], prompt: str) -> str:
+    return await analysis_cache.get_or_analyze(query, query_type, stocks, prompt)
+
+def stream_cached_analysis(query: str, query_type: str, stocks: Sequence[StockData], prompt: str) -> AsyncIterator[str]:
+    return analysis_cache.stream(query, query_type, stocks, prompt)
+
+def get_analysis_cache_stats() -> Dict[str, Any]:
+    return analysis_cache.stats()
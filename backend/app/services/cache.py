@@ -0,0 +1,165 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+class TTLCache:
+    """In-memory LRU cache with per-entry expiry and an optional SQLite backing store.
+
+    Values must be JSON serializable when a backing store path is given. Entries
+    read back from disk are promoted into memory so a restarted process starts warm.
+    Expired entries are kept for a further `stale_ttl` seconds so callers can fall
+    back to the last known good value through get_stale().
+
+    Disk writes are deferred: set() and delete() only queue the change, and a
+    background thread commits queued changes in one transaction `flush_interval`
+    seconds later, so callers on the event loop never wait on SQLite.
+    """
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, name: str = "cache", stale_ttl: float = 0,
+                 flush_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.name = name
+        self.stale_ttl = stale_ttl
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # Changes not yet committed to disk; None marks a deleted key
+        self._pending: Dict[str, Optional[Tuple[Any, float]]] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM entries WHERE expires_at < ?", (time.time() - stale_ttl,))
+            self._db.commit()
+            atexit.register(self.flush)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry[1] >= time.time():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, expires_at) even if the entry has expired, as long as it is within stale_ttl"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry[1] + self.stale_ttl >= time.time():
+                return entry
+            return None
+
+    def set(self, key: str, value: Any, ttl: float):
+        entry = (value, time.time() + ttl)
+        with self._lock:
+            self._store(key, entry)
+            self._queue_write(key, entry)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._queue_write(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM entries")
+                    self._db.commit()
+
+    def flush(self):
+        """Commit queued writes to the backing store"""
+        with self._lock:
+            self._flush_timer = None
+            batch = dict(self._pending)
+        if not batch:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(entry[0]), entry[1]) for key, entry in batch.items() if entry is not None]
+            )
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, entry in batch.items() if entry is None])
+            writes, self._writes = self._writes, self._writes + len(batch)
+            if writes // 100 != self._writes // 100:
+                self._prune_disk()
+            self._db.commit()
+        with self._lock:
+            # Keys changed again while committing stay queued for the next flush
+            for key, entry in batch.items():
+                if key in self._pending and self._pending[key] is entry:
+                    del self._pending[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _queue_write(self, key: str, entry: Optional[Tuple[Any, float]]):
+        if self._db is None:
+            return
+        self._pending[key] = entry
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            # A queued write is newer than the disk and may already be evicted from memory
+            entry = self._pending[key] if key in self._pending else self._load(key)
+            if entry is not None:
+                self._store(key, entry)
+        if entry is None:
+            return None
+        if entry[1] + self.stale_ttl < time.time():
+            # Entries past their stale window are dropped lazily on read
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: Tuple[Any, float]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _prune_disk(self):
+        self._db.execute("DELETE FROM entries WHERE expires_at < ?", (time.time() - self.stale_ttl,))
+        self._db.execute(
+            "DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
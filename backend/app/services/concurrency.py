@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # a user is waiting on the answer (stock and PDF queries)
+    BACKGROUND = 1   # work a user will look at later (document analysis)
+    BULK = 2         # throughput work (PDF ingestion embeddings)
+
+# Callers tag their LLM work through these instead of threading arguments through every
+# helper; tasks spawned inside a request inherit them automatically
+current_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.INTERACTIVE)
+current_user: ContextVar[Optional[str]] = ContextVar("llm_user", default=None)
+_request_waits: ContextVar[Optional[List[float]]] = ContextVar("llm_request_waits", default=None)
+
+@contextmanager
+def llm_context(user: Any = None, priority: Optional[Priority] = None):
+    """Attribute LLM calls made inside the block to a user and priority class, and collect their queue waits"""
+    tokens = [(_request_waits, _request_waits.set([]))]
+    if user is not None:
+        tokens.append((current_user, current_user.set(str(user))))
+    if priority is not None:
+        tokens.append((current_priority, current_priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+@contextmanager
+def llm_priority(priority: Priority):
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+def request_queue_wait() -> float:
+    """Total seconds LLM calls in the current llm_context() spent queued"""
+    waits = _request_waits.get()
+    return sum(waits) if waits else 0.0
+
+class PriorityScheduler:
+    """Caps concurrent calls to a slow dependency and decides who goes next.
+
+    Waiters are served strictly by priority class and, within a class, round-robin
+    across users, so one user's burst of uploads cannot starve other users or
+    interactive queries. Queue depth and wait times are exposed through stats().
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.completed = 0
+        self._queues: Dict[Priority, "OrderedDict[Optional[str], Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._waits = {priority: {"completed": 0, "total": 0.0, "max": 0.0} for priority in Priority}
+        self.max_waiting = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[Priority] = None, user: Optional[str] = None):
+        priority = current_priority.get() if priority is None else priority
+        user = current_user.get() if user is None else user
+        started = time.monotonic()
+        await self._acquire(priority, user)
+        self._record_wait(priority, time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    def waiting(self) -> int:
+        return sum(len(waiters) for users in self._queues.values() for waiters in users.values())
+
+    def stats(self) -> Dict[str, Any]:
+        priorities = {}
+        for priority in Priority:
+            waits = self._waits[priority]
+            priorities[priority.name.lower()] = {
+                "queue_depth": sum(len(waiters) for waiters in self._queues[priority].values()),
+                "waiting_users": len(self._queues[priority]),
+                "completed": waits["completed"],
+                "avg_wait_seconds": waits["total"] / waits["completed"] if waits["completed"] else 0.0,
+                "max_wait_seconds": waits["max"],
+            }
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.waiting(),
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "priorities": priorities,
+        }
+
+    async def _acquire(self, priority: Priority, user: Optional[str]):
+        if self.active < self.limit and not self.waiting():
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user, deque()).append(waiter)
+        self.max_waiting = max(self.max_waiting, self.waiting())
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release()
+            else:
+                self._discard(priority, user, waiter)
+            raise
+
+    def _release(self):
+        self.active -= 1
+        while self.active < self.limit:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.active += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for priority in Priority:
+            users = self._queues[priority]
+            while users:
+                # Serve the user at the head of the rotation, then move them to the back
+                user, waiters = users.popitem(last=False)
+                waiter = waiters.popleft()
+                if waiters:
+                    users[user] = waiters
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _discard(self, priority: Priority, user: Optional[str], waiter: asyncio.Future):
+        waiters = self._queues[priority].get(user)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._queues[priority][user]
+
+    def _record_wait(self, priority: Priority, waited: float):
+        waits = self._waits[priority]
+        waits["completed"] += 1
+        waits["total"] += waited
+        waits["max"] = max(waits["max"], waited)
+        request_waits = _request_waits.get()
+        if request_waits is not None:
+            request_waits.append(waited)
@@ -0,0 +1,46 @@
+import json
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models.pdf_document import PDFDocument
+from app.schemas.pdf_document import DocumentAnalysis, DocumentMetadata, DocumentUploadResponse
+
+# Ingested documents are registered by the sha256 of their bytes, so uploading the
+# same file again (by anyone) reuses its doc_id, vectors and analysis instead of
+# running the pipeline a second time.
+
+def find_document(content_hash: str) -> Optional[DocumentUploadResponse]:
+    with SessionLocal() as db:
+        document = db.query(PDFDocument).filter(PDFDocument.content_hash == content_hash).first()
+        if document is None:
+            return None
+        return DocumentUploadResponse(
+            doc_id=document.doc_id,
+            filename=document.filename,
+            analysis=DocumentAnalysis(**json.loads(document.analysis_json)),
+            metadata=DocumentMetadata(**json.loads(document.metadata_json)),
+            chunk_ids=json.loads(document.chunk_ids),
+            duplicate=True
+        )
+
+def register_document(user_id: int, content_hash: str, result: DocumentUploadResponse) -> bool:
+    """Record a finished ingestion; False if the same content was registered meanwhile"""
+    with SessionLocal() as db:
+        db.add(PDFDocument(
+            doc_id=result.doc_id,
+            content_hash=content_hash,
+            user_id=user_id,
+            filename=result.filename,
+            title=result.metadata.title,
+            num_pages=result.metadata.num_pages,
+            file_size_kb=result.metadata.file_size_kb,
+            metadata_json=result.metadata.model_dump_json(),
+            analysis_json=result.analysis.model_dump_json(),
+            chunk_ids=json.dumps(result.chunk_ids)
+        ))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
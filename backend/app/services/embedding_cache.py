@@ -0,0 +1,103 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+class EmbeddingCache:
+    """Content-addressed, disk-backed cache of embedding vectors.
+
+    Entries are keyed by (model, task_type, sha256(text)) and stored as float32
+    blobs in SQLite, so identical text is embedded once across uploads, queries and
+    restarts. When the table grows past max_entries the least recently used rows
+    are dropped.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # An empty path keeps the cache in memory for the life of the process
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, task_type TEXT NOT NULL, text_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, task_type, text_hash))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, task_type, [text])[0]
+
+    def get_many(self, model: str, task_type: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up several texts in one transaction; missing entries come back as None"""
+        hashes = [self.text_hash(text) for text in texts]
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            for text_hash in set(hashes):
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    (model, task_type, text_hash)
+                ).fetchone()
+                if row is not None:
+                    found[text_hash] = row[0]
+            if found:
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    [(now, model, task_type, text_hash) for text_hash in found]
+                )
+                self._db.commit()
+            self.hits += sum(1 for text_hash in hashes if text_hash in found)
+            self.misses += sum(1 for text_hash in hashes if text_hash not in found)
+        return [np.frombuffer(found[h], dtype=np.float32).tolist() if h in found else None for h in hashes]
+
+    def set(self, model: str, task_type: str, text: str, vector: List[float]):
+        self.set_many(model, task_type, [text], [vector])
+
+    def set_many(self, model: str, task_type: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [
+            (model, task_type, self.text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            previous, self._writes = self._writes, self._writes + len(rows)
+            if previous // 500 != self._writes // 500:
+                self._prune()
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _prune(self):
+        self._db.execute(
+            "DELETE FROM embeddings WHERE rowid NOT IN (SELECT rowid FROM embeddings ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,)
+        )
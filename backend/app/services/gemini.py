@@ -1,23 +1,116 @@
-import google.generativeai as genai
+import asyncio
 from app.config import settings
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from fastapi import HTTPException
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from app.services.concurrency import PriorityScheduler
+from app.services.embedding_cache import EmbeddingCache
+from app.services.rate_limiter import SingleFlight
+from app.services.llm_provider import get_provider
 
-# Initialize Gemini API
-genai.configure(api_key=settings.gemini_api_key)
-gemini_model = genai.GenerativeModel('gemini-1.5-pro')
+# Generation and embedding calls are dispatched to the provider selected by
+# settings.llm_provider (Gemini, or the offline stand-in for benchmarks).
+
+# All Gemini calls use the SDK's async API behind bounded schedulers so a burst of
+# LLM work queues up instead of stalling the event loop or flooding the provider.
+# Queued calls are served by priority (see concurrency.Priority), round-robin across users
+generation_limiter = PriorityScheduler("gemini_generate", settings.gemini_max_concurrency)
+embedding_limiter = PriorityScheduler("gemini_embed", settings.gemini_embed_max_concurrency)
+
+# Every embedding (document chunks at ingest, user questions at query time) goes
+# through this cache, so identical text is only ever sent to the API once
+embedding_cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_entries)
+embedding_flights = SingleFlight()
 
 # Initialize Qdrant client
 qdrant_client = QdrantClient(url=settings.qdrant_url)
 
-async def analyze_with_gemini(prompt: str) -> str:
+async def analyze_with_gemini(prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+    try:
+        async with generation_limiter.slot():
+            return await get_provider().generate(prompt, response_schema=response_schema)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error analyzing with Gemini: {str(e)}")
+
+async def stream_with_gemini(prompt: str) -> AsyncIterator[str]:
+    """Yield the response text in chunks as Gemini generates it"""
     try:
-        response = gemini_model.generate_content(prompt)
-        return response.text
+        async with generation_limiter.slot():
+            async for text in get_provider().generate_stream(prompt):
+                yield text
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing with Gemini: {str(e)}")
 
+async def embed_with_gemini(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> List[float]:
+    provider = get_provider()
+    cached = embedding_cache.get(provider.embedding_model, task_type, text)
+    if cached is not None:
+        return cached
+
+    async def embed() -> List[float]:
+        async with embedding_limiter.slot():
+            embedding = (await provider.embed([text], task_type))[0]
+        embedding_cache.set(provider.embedding_model, task_type, text, embedding)
+        return embedding
+
+    # Identical text requested concurrently (repeated chunks, simultaneous questions) is embedded once
+    embedding, _ = await embedding_flights.do(f"{task_type}:{EmbeddingCache.text_hash(text)}", embed)
+    return embedding
+
+async def embed_batch_with_gemini(
+    texts: List[str],
+    task_type: str = "RETRIEVAL_DOCUMENT",
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> List[List[float]]:
+    """Embed many texts with batched requests, skipping anything already in the embedding cache.
+
+    Uncached texts are sent in batches of settings.embedding_batch_size, at most
+    settings.embedding_batch_concurrency batches at a time. A failing batch is retried
+    with exponential backoff; if it still fails the error is raised rather than
+    leaving holes in the result. on_progress(done, total) is called as texts complete.
+    """
+    provider = get_provider()
+    embeddings = embedding_cache.get_many(provider.embedding_model, task_type, texts)
+    # Embed each distinct uncached text once
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    size = settings.embedding_batch_size
+    batches = [missing[i:i + size] for i in range(0, len(missing), size)]
+    semaphore = asyncio.Semaphore(settings.embedding_batch_concurrency)
+    done = len(texts) - len(missing)
+
+    async def embed(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            for attempt in range(settings.embedding_batch_retries + 1):
+                try:
+                    async with embedding_limiter.slot():
+                        vectors = await provider.embed(batch, task_type)
+                    break
+                except Exception as e:
+                    if attempt == settings.embedding_batch_retries:
+                        raise
+                    delay = 2 ** attempt
+                    print(f"Embedding batch of {len(batch)} failed ({str(e)}), retrying in {delay}s")
+                    await asyncio.sleep(delay)
+        embedding_cache.set_many(provider.embedding_model, task_type, batch, vectors)
+        if on_progress is not None:
+            nonlocal done
+            done += len(batch)
+            on_progress(min(done, len(texts)), len(texts))
+        return vectors
+
+    results = await asyncio.gather(*(embed(batch) for batch in batches))
+    fresh = {text: embedding for batch, vectors in zip(batches, results) for text, embedding in zip(batch, vectors)}
+    return [embedding if embedding is not None else fresh[text] for text, embedding in zip(texts, embeddings)]
+
+def get_gemini_stats() -> Dict[str, Any]:
+    return {
+        "provider": settings.llm_provider,
+        "generate": generation_limiter.stats(),
+        "embed": embedding_limiter.stats(),
+        "embedding_cache": embedding_cache.stats(),
+    }
+
 async def detect_query_type(query: str, context: str = "stock") -> str:
     try:
         if context == "stock":
@@ -53,12 +146,8 @@ async def detect_query_type(query: str, context: str = "stock") -> str:
 async def search_vector_db(query: str, collection: str, doc_id: str = None, limit: int = 5) -> list:
     try:
         # Generate embedding for the query
-        embedding_response = genai.embed_content(
-            model="models/embedding-001",
-            content=query,
-            task_type="RETRIEVAL_DOCUMENT"  # Changed from RETRIEVAL_QUERY to RETRIEVAL_DOCUMENT for consistency
-        )
-        embedding = embedding_response['embedding']
+        # RETRIEVAL_DOCUMENT rather than RETRIEVAL_QUERY for consistency with the stored chunks
+        embedding = await embed_with_gemini(query, task_type="RETRIEVAL_DOCUMENT")
         
         # Verify embedding dimension and fix if needed
         if len(embedding) != 1536 and collection == "documents":
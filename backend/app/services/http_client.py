@@ -0,0 +1,39 @@
+import httpx
+from typing import Optional
+from app.config import settings
+
+# Application-lifetime client shared by every outbound market-data call so
+# connections (and their TLS sessions) are pooled and reused across requests.
+_client: Optional[httpx.AsyncClient] = None
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.http2_enabled,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.http_timeout)
+    )
+
+async def init_http_client() -> httpx.AsyncClient:
+    """Create the shared client; called once on application startup"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+async def close_http_client():
+    """Close the shared client and its pooled connections on application shutdown"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily when used outside the app lifecycle (e.g. scripts)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
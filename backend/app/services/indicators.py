@@ -0,0 +1,138 @@
+import warnings
+import numpy as np
+from typing import Dict, Sequence, Tuple
+
+# Vectorized technical indicators. Every function takes a 1-D series or a 2-D array
+# of shape (symbols, days), oldest day first, and returns the same shape. Rows may be
+# left-padded with NaN (see stack_series) so histories of different lengths can be
+# computed together; values are NaN until a row has enough observations.
+
+def stack_series(series: Sequence[np.ndarray], length: int = None) -> np.ndarray:
+    """Right-align 1-D series into a (symbols, length) float array, left-padding with NaN"""
+    length = length or max((len(s) for s in series), default=0)
+    matrix = np.full((len(series), length), np.nan)
+    for i, values in enumerate(series):
+        values = np.asarray(values, dtype=float)[-length:]
+        if len(values):
+            matrix[i, -len(values):] = values
+    return matrix
+
+def _as_2d(values: np.ndarray) -> Tuple[np.ndarray, bool]:
+    values = np.asarray(values, dtype=float)
+    return np.atleast_2d(values), values.ndim == 1
+
+def _restore(result: np.ndarray, was_1d: bool) -> np.ndarray:
+    return result[0] if was_1d else result
+
+def _rolling(values: np.ndarray, window: int, reducer) -> np.ndarray:
+    matrix, was_1d = _as_2d(values)
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(matrix, window, axis=1)
+        result[:, window - 1:] = reducer(windows, axis=-1)
+    return _restore(result, was_1d)
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.mean)
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.std)
+
+def rolling_high(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.max)
+
+def rolling_low(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, np.min)
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average seeded with each row's first observation"""
+    matrix, was_1d = _as_2d(values)
+    alpha = 2.0 / (span + 1)
+    result = np.full(matrix.shape, np.nan)
+    previous = np.full(matrix.shape[0], np.nan)
+    for t in range(matrix.shape[1]):
+        current = matrix[:, t]
+        previous = np.where(
+            np.isnan(previous), current,
+            np.where(np.isnan(current), previous, alpha * current + (1 - alpha) * previous)
+        )
+        result[:, t] = previous
+    return _restore(result, was_1d)
+
+def _wilder(matrix: np.ndarray, period: int) -> np.ndarray:
+    """Wilder smoothing: a simple average of the first `period` observations, then a 1/period recursive average"""
+    result = np.full(matrix.shape, np.nan)
+    total = np.zeros(matrix.shape[0])
+    count = np.zeros(matrix.shape[0], dtype=int)
+    average = np.full(matrix.shape[0], np.nan)
+    for t in range(matrix.shape[1]):
+        current = matrix[:, t]
+        valid = ~np.isnan(current)
+        warming = valid & (count < period)
+        total[warming] += current[warming]
+        count[valid] += 1
+        seeded = warming & (count == period)
+        average[seeded] = total[seeded] / period
+        smoothing = valid & ~warming
+        average[smoothing] = (average[smoothing] * (period - 1) + current[smoothing]) / period
+        result[:, t] = np.where(count >= period, average, np.nan)
+    return result
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    matrix, was_1d = _as_2d(close)
+    delta = np.full(matrix.shape, np.nan)
+    delta[:, 1:] = np.diff(matrix, axis=1)
+    average_gain = _wilder(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), period)
+    average_loss = _wilder(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 100 - 100 / (1 + average_gain / average_loss)
+    # No losses over the window means RSI is pinned at 100
+    result = np.where((average_loss == 0) & ~np.isnan(average_gain), 100.0, result)
+    return _restore(result, was_1d)
+
+def bollinger_bands(close: np.ndarray, window: int = 20, num_std: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(middle, upper, lower) bands"""
+    middle = sma(close, window)
+    spread = num_std * rolling_std(close, window)
+    return middle, middle + spread, middle - spread
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(macd line, signal line, histogram)"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    previous_close = np.full(close.shape, np.nan)
+    previous_close[:, 1:] = close[:, :-1]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return _restore(_wilder(true_range, period), was_1d)
+
+def latest_snapshot(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+    """Latest value of every indicator per row, for single-symbol analysis and bulk screening alike"""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    _, upper, lower = bollinger_bands(close)
+    line, signal_line, _ = macd(close)
+    with warnings.catch_warnings():
+        # Rows with no data at all produce NaN rather than a warning
+        warnings.simplefilter("ignore", RuntimeWarning)
+        snapshot = {
+            "rsi_14": rsi(close)[:, -1],
+            "sma_50": np.nanmean(close[:, -50:], axis=1),
+            "ema_20": ema(close, 20)[:, -1],
+            "bollinger_upper": upper[:, -1],
+            "bollinger_lower": lower[:, -1],
+            "macd": line[:, -1],
+            "macd_signal": signal_line[:, -1],
+            "atr_14": atr(high, low, close)[:, -1],
+            "high_252": np.nanmax(close[:, -252:], axis=1),
+            "low_252": np.nanmin(close[:, -252:], axis=1),
+            "high_30": np.nanmax(close[:, -30:], axis=1),
+            "low_30": np.nanmin(close[:, -30:], axis=1),
+        }
+    return {name: _restore(values, was_1d) for name, values in snapshot.items()}
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from app.config import settings
+from app.schemas.pdf_document import (
+    DocumentAnalysis, DocumentMetadata, DocumentUploadResponse, IngestionJob, IngestionStage, JobStatus
+)
+from app.services.pdf_processor import (
+    extract_pdf, chunk_document, store_in_vector_db, analyze_document, document_id_for
+)
+from app.services.concurrency import llm_context
+from app.services.document_registry import find_document, register_document
+
+logger = logging.getLogger(__name__)
+
+# Share of the overall progress bar each stage accounts for
+STAGE_WEIGHTS = {"extract": 0.15, "chunk": 0.05, "embed": 0.5, "analyze": 0.3}
+
+class IngestionQueue:
+    """Runs PDF uploads through extract, chunk, embed and analyze in background workers.
+
+    Each job gets a directory holding the upload, its state.json and the output of
+    finished stages, so a job interrupted by a restart resumes from the last stage
+    it completed instead of starting over. Finished jobs keep only state.json.
+
+    Uploads are deduplicated by content hash: a file already in the document registry
+    completes at once, and one identical to a job still in flight waits for that job
+    and completes with its result instead of running the pipeline again.
+    """
+
+    def __init__(self, directory: str, workers: int):
+        self.directory = directory
+        self.workers = workers
+        self.jobs: Dict[str, IngestionJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Dict[str, str] = {}  # content hash -> job running the pipeline for it
+        self._waiting: Dict[str, List[str]] = {}  # content hash -> jobs waiting on that job
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._inflight, self._waiting = {}, {}
+        self._load()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, user_id: int, filename: str, document_name: Optional[str], upload_path: str,
+               content_hash: Optional[str] = None) -> IngestionJob:
+        """Queue a spooled upload; the file is moved into the job's directory.
+
+        When content_hash matches a registered document the job completes immediately
+        with that document's result and the upload is discarded.
+        """
+        now = datetime.utcnow()
+        job = IngestionJob(
+            job_id=str(uuid.uuid4()),
+            user_id=user_id,
+            filename=filename,
+            document_name=document_name,
+            content_hash=content_hash,
+            stages=[IngestionStage(name=name) for name in STAGE_WEIGHTS],
+            created_at=now,
+            updated_at=now
+        )
+        os.makedirs(self._path(job.job_id), exist_ok=True)
+        existing = find_document(content_hash) if content_hash else None
+        if existing is not None:
+            os.remove(upload_path)
+            self.jobs[job.job_id] = job
+            self._complete(job, self._as_duplicate(job, existing))
+            return job
+        shutil.move(upload_path, self._path(job.job_id, "upload.pdf"))
+        self._admit(job)
+        return job
+
+    def retry(self, job: IngestionJob) -> IngestionJob:
+        if job.status != JobStatus.FAILED:
+            raise HTTPException(status_code=409, detail="Only failed jobs can be retried")
+        if not os.path.exists(self._path(job.job_id, "upload.pdf")):
+            raise HTTPException(status_code=410, detail="The uploaded file is no longer available")
+        job.error = None
+        self._admit(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def list_for_user(self, user_id: int) -> List[IngestionJob]:
+        jobs = [job for job in self.jobs.values() if job.user_id == user_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def _admit(self, job: IngestionJob):
+        """Queue a job, or park it behind the in-flight job for the same content"""
+        job.status = JobStatus.QUEUED
+        self.jobs[job.job_id] = job
+        self._save(job)
+        if job.content_hash:
+            if job.content_hash in self._inflight:
+                self._waiting.setdefault(job.content_hash, []).append(job.job_id)
+                return
+            self._inflight[job.content_hash] = job.job_id
+        self._queue.put_nowait(job.job_id)
+
+    def _finish_flight(self, job: IngestionJob, result: Optional[DocumentUploadResponse]):
+        """Hand the outcome of a job to the jobs waiting on the same content"""
+        if not job.content_hash or self._inflight.get(job.content_hash) != job.job_id:
+            return
+        del self._inflight[job.content_hash]
+        waiting = [self.jobs[job_id] for job_id in self._waiting.pop(job.content_hash, [])]
+        if result is not None:
+            for waiter in waiting:
+                self._complete(waiter, self._as_duplicate(waiter, result))
+        elif waiting:
+            # The first waiter runs the pipeline itself; the rest wait on it instead
+            for waiter in waiting:
+                self._admit(waiter)
+
+    @staticmethod
+    def _as_duplicate(job: IngestionJob, result: DocumentUploadResponse) -> DocumentUploadResponse:
+        """An earlier upload's result, named as this upload was"""
+        metadata = result.metadata.model_copy(update={
+            "filename": job.filename,
+            "title": job.document_name or result.metadata.title
+        })
+        return result.model_copy(update={"filename": job.filename, "metadata": metadata, "duplicate": True})
+
+    async def _worker(self):
+        while True:
+            job = self.jobs.get(await self._queue.get())
+            try:
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob):
+        job.status = JobStatus.RUNNING
+        try:
+            # An identical upload queued earlier may have finished while this one waited
+            existing = find_document(job.content_hash) if job.content_hash else None
+            if existing is not None:
+                self._complete(job, self._as_duplicate(job, existing))
+                self._finish_flight(job, existing)
+                return
+
+            metadata_path, pages_path = self._path(job.job_id, "metadata.json"), self._path(job.job_id, "pages.json")
+
+            async with self._stage(job, "extract") as stage:
+                if os.path.exists(metadata_path) and os.path.exists(pages_path):
+                    stage.status = "done"
+                else:
+                    # A content-derived doc_id keeps point ids stable, so re-ingesting the same
+                    # bytes overwrites its vectors instead of leaving orphans behind
+                    doc_id = document_id_for(job.content_hash) if job.content_hash else None
+                    metadata, pages = await extract_pdf(self._path(job.job_id, "upload.pdf"), job.filename, doc_id)
+                    if job.document_name:
+                        metadata.title = job.document_name
+                    self._write_json(pages_path, pages)
+                    self._write_json(metadata_path, metadata.model_dump(mode="json"))
+            metadata = DocumentMetadata(**self._read_json(metadata_path))
+            pages = self._read_json(pages_path)
+            job.doc_id = metadata.doc_id
+
+            # Chunking is cheap and deterministic, so it is recomputed rather than stored
+            async with self._stage(job, "chunk"):
+                chunks = await chunk_document(pages, metadata.doc_id)
+
+            # Vectors live in Qdrant, which may have been reset since an interrupted run;
+            # re-embedding is served from the embedding cache
+            async with self._stage(job, "embed") as stage:
+                def on_progress(done: int, total: int):
+                    stage.done, stage.total = done, total
+                    self._update_progress(job)
+                with llm_context(job.user_id):
+                    await store_in_vector_db(chunks, metadata.doc_id, metadata, on_progress=on_progress)
+
+            analysis_path = self._path(job.job_id, "analysis.json")
+            async with self._stage(job, "analyze") as stage:
+                if os.path.exists(analysis_path):
+                    stage.status = "done"
+                else:
+                    with llm_context(job.user_id):
+                        analysis = await analyze_document(pages, metadata)
+                    self._write_json(analysis_path, analysis.model_dump(mode="json"))
+            analysis = DocumentAnalysis(**self._read_json(analysis_path))
+
+            result = DocumentUploadResponse(
+                doc_id=metadata.doc_id,
+                filename=metadata.filename,
+                analysis=analysis,
+                metadata=metadata,
+                chunk_ids=[chunk.chunk_id for chunk in chunks]
+            )
+            if job.content_hash and not register_document(job.user_id, job.content_hash, result):
+                logger.warning("Ingestion job %s: content %s was already registered", job.job_id, job.content_hash)
+            self._complete(job, result)
+            self._finish_flight(job, result)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job queued so the next start() resumes it
+            job.status = JobStatus.QUEUED
+            self._save(job)
+            raise
+        except Exception as e:
+            logger.error("Ingestion job %s failed at %s: %s", job.job_id, job.stage, e)
+            job.status = JobStatus.FAILED
+            job.error = getattr(e, "detail", None) or str(e)
+            self._save(job)
+            self._finish_flight(job, None)
+
+    def _complete(self, job: IngestionJob, result: DocumentUploadResponse):
+        job.result = result
+        job.doc_id = result.doc_id
+        job.status = JobStatus.COMPLETED
+        job.stage = None
+        for stage in job.stages:
+            stage.status = "done"
+        self._update_progress(job)
+        self._save(job)
+        self._cleanup(job)
+
+    @asynccontextmanager
+    async def _stage(self, job: IngestionJob, name: str):
+        stage = next(s for s in job.stages if s.name == name)
+        if stage.status != "done":
+            stage.status = "running"
+            stage.done = 0
+        job.stage = name
+        self._update_progress(job)
+        self._save(job)
+        yield stage
+        stage.status = "done"
+        stage.done = stage.total = max(stage.total, 1)
+        self._update_progress(job)
+        self._save(job)
+
+    def _update_progress(self, job: IngestionJob):
+        progress = 0.0
+        for stage in job.stages:
+            weight = STAGE_WEIGHTS.get(stage.name, 0.0)
+            if stage.status == "done":
+                progress += weight
+            elif stage.status == "running" and stage.total:
+                progress += weight * stage.done / stage.total
+        job.progress = round(min(progress, 1.0), 3)
+        job.updated_at = datetime.utcnow()
+
+    def _path(self, job_id: str, name: Optional[str] = None) -> str:
+        directory = os.path.join(self.directory, job_id)
+        return os.path.join(directory, name) if name else directory
+
+    def _save(self, job: IngestionJob):
+        path = self._path(job.job_id, "state.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(job.model_dump_json())
+        os.replace(tmp_path, path)
+
+    def _load(self):
+        """Pick up jobs from previous runs: requeue unfinished ones, drop expired ones"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.ingest_job_retention)
+        for job_id in os.listdir(self.directory):
+            path = self._path(job_id, "state.json")
+            try:
+                with open(path) as f:
+                    job = IngestionJob.model_validate_json(f.read())
+            except Exception as e:
+                logger.warning("Skipping unreadable ingestion job %s: %s", job_id, e)
+                continue
+            if job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                if job.updated_at < cutoff:
+                    shutil.rmtree(self._path(job_id), ignore_errors=True)
+                else:
+                    self.jobs[job_id] = job
+            else:
+                logger.info("Resuming ingestion job %s (%s)", job_id, job.filename)
+                self._admit(job)
+
+    def _cleanup(self, job: IngestionJob):
+        for name in ("upload.pdf", "metadata.json", "pages.json", "analysis.json"):
+            try:
+                os.remove(self._path(job.job_id, name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_json(path: str, data):
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _read_json(path: str):
+        with open(path) as f:
+            return json.load(f)
+
+ingestion_queue = IngestionQueue(settings.ingest_job_dir, settings.ingest_workers)
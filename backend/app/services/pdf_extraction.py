@@ -0,0 +1,52 @@
+import io
+import mmap
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Union
+import pypdf
+
+# Plain pypdf helpers with no app imports, so process pool workers can import
+# this module without opening the Qdrant client or cache databases.
+# Sources are a file path, which is memory-mapped so pypdf reads the file through
+# the page cache instead of copying it into process memory, or in-memory bytes.
+
+PdfSource = Union[str, bytes]
+
+@contextmanager
+def open_pdf(source: PdfSource):
+    if isinstance(source, bytes):
+        yield pypdf.PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield pypdf.PdfReader(mapped)
+
+def extract_page_range(source: PdfSource, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Text of pages [start, stop), skipping pages without text; page_num is 1-based"""
+    with open_pdf(source) as reader:
+        return _page_text(reader, start, stop)
+
+def _page_text(reader: pypdf.PdfReader, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+    pages = []
+    for i in range(start, len(reader.pages) if stop is None else stop):
+        text = reader.pages[i].extract_text()
+        if text:
+            pages.append({"page_num": i + 1, "text": text})
+    return pages
+
+def read_pdf(source: PdfSource, max_inline_pages: Optional[int] = None) -> Dict[str, Any]:
+    """Info fields and page count from one reader, plus every page's text unless the
+    document has more than max_inline_pages pages (then "pages" is None)"""
+    with open_pdf(source) as reader:
+        return _read_info(reader, max_inline_pages)
+
+def _read_info(reader: pypdf.PdfReader, max_inline_pages: Optional[int]) -> Dict[str, Any]:
+    info = reader.metadata
+    created = info.creation_date if info and hasattr(info, 'creation_date') else None
+    num_pages = len(reader.pages)
+    inline = max_inline_pages is None or num_pages <= max_inline_pages
+    return {
+        "title": info.title if info and hasattr(info, 'title') else None,
+        "author": info.author if info and hasattr(info, 'author') else None,
+        "num_pages": num_pages,
+        "created_date": created.strftime("%Y-%m-%d") if created else None,
+        "pages": _page_text(reader) if inline else None,
+    }
@@ -1,53 +1,86 @@
-import pypdf
-import io
+import asyncio
+import hashlib
+import multiprocessing
+import os
 import uuid
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from app.schemas.pdf_document import DocumentMetadata, DocumentChunk, DocumentAnalysis
-from app.services.gemini import analyze_with_gemini, search_vector_db, detect_query_type
+from app.services.gemini import analyze_with_gemini, embed_batch_with_gemini, search_vector_db, detect_query_type
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from app.config import settings
-import google.generativeai as genai
-
-# Initialize Gemini API
-genai.configure(api_key=settings.gemini_api_key)
+from app.services.concurrency import Priority, llm_priority
+from app.services.cache import TTLCache
+from app.services.pdf_extraction import PdfSource, read_pdf, extract_page_range
 
 qdrant_client = QdrantClient(url=settings.qdrant_url)
+DOCUMENT_POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "qdrant/documents")
 
-async def extract_text_from_pdf(file_content: bytes) -> List[Dict[str, Any]]:
-    try:
-        reader = pypdf.PdfReader(io.BytesIO(file_content))
-        pages = []
-        
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if text:
-                pages.append({
-                    "page_num": i + 1,
-                    "text": text
-                })
-        return pages
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
+# Map-step summaries for long documents, keyed by the sha256 of the summarized text
+section_summary_cache = TTLCache(
+    max_entries=settings.document_summary_cache_max_entries,
+    path=settings.document_summary_cache_path or None,
+    name="document_summaries"
+)
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
 
-async def extract_metadata_from_pdf(file_content: bytes, filename: str) -> DocumentMetadata:
+def _extract_workers() -> int:
+    return settings.pdf_extract_workers or os.cpu_count() or 1
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        # spawn rather than fork: the parent holds threads, sockets and SQLite handles
+        _extract_pool = ProcessPoolExecutor(
+            max_workers=_extract_workers(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extract_pool
+
+def shutdown_extract_pool():
+    global _extract_pool
+    if _extract_pool is not None:
+        _extract_pool.shutdown(cancel_futures=True)
+        _extract_pool = None
+
+async def extract_pdf(
+    source: PdfSource,
+    filename: str,
+    doc_id: Optional[str] = None
+) -> Tuple[DocumentMetadata, List[Dict[str, Any]]]:
+    """Metadata and page text from a single parse of a file path or in-memory bytes.
+
+    Small documents are read in one worker thread. Past pdf_parallel_min_pages, page
+    text is extracted in ranges across a process pool so parsing uses every core.
+    Either way the event loop is never blocked on pypdf. Without a doc_id the
+    document gets a random one.
+    """
     try:
-        reader = pypdf.PdfReader(io.BytesIO(file_content))
-        info = reader.metadata
-        
+        # With a single core a pool only adds pickling and a second parse per range
+        max_inline_pages = settings.pdf_parallel_min_pages if _extract_workers() > 1 else None
+        info = await asyncio.to_thread(read_pdf, source, max_inline_pages)
+        pages = info.pop("pages")
+        if pages is None:
+            loop = asyncio.get_running_loop()
+            pool = _get_extract_pool()
+            step = settings.pdf_extract_pages_per_task
+            ranges = await asyncio.gather(*[
+                loop.run_in_executor(pool, extract_page_range, source, start, min(start + step, info["num_pages"]))
+                for start in range(0, info["num_pages"], step)
+            ])
+            pages = [page for page_range in ranges for page in page_range]
         metadata = DocumentMetadata(
-            doc_id=str(uuid.uuid4()),
+            doc_id=doc_id or str(uuid.uuid4()),
             filename=filename,
-            title=info.title if info and hasattr(info, 'title') else None,
-            author=info.author if info and hasattr(info, 'author') else None,
-            num_pages=len(reader.pages),
-            created_date=info.creation_date.strftime("%Y-%m-%d") if info and hasattr(info, 'creation_date') and info.creation_date else None,
-            file_size_kb=len(file_content) / 1024
+            file_size_kb=(len(source) if isinstance(source, bytes) else os.path.getsize(source)) / 1024,
+            **info
         )
-        return metadata
+        return metadata, pages
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error extracting metadata from PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
 
 async def chunk_document(pages: List[Dict[str, Any]], doc_id: str, chunk_size: int = 1000) -> List[DocumentChunk]:
     chunks = []
@@ -81,68 +114,83 @@ async def chunk_document(pages: List[Dict[str, Any]], doc_id: str, chunk_size: i
             ))
     return chunks
 
-# filepath: g:\AI Hackathon\stock_flow_ai\backend\app\services\pdf_processor.py
-async def generate_embedding(text: str) -> List[float]:
-    try:
-        embedding_response = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="RETRIEVAL_DOCUMENT"  # This produces 1536-dim embeddings
-        )
-        return embedding_response['embedding']
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating embedding: {str(e)}")
-    
-async def store_in_vector_db(chunks: List[DocumentChunk], doc_id: str, metadata: DocumentMetadata) -> List[str]:
+def document_id_for(content_hash: str) -> str:
+    """Doc id derived from a document's sha256, so its chunk and point ids are the same on every ingestion"""
+    return str(uuid.uuid5(DOCUMENT_POINT_NAMESPACE, content_hash))
+
+def point_id_for(doc_id: str, chunk_id: str) -> str:
+    """Stable Qdrant point id for a chunk, so re-ingesting a document overwrites its points"""
+    return str(uuid.uuid5(DOCUMENT_POINT_NAMESPACE, f"{doc_id}/{chunk_id}"))
+
+async def store_in_vector_db(
+    chunks: List[DocumentChunk],
+    doc_id: str,
+    metadata: DocumentMetadata,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> List[str]:
     try:
         embedding_ids = []
-        
-        for chunk in chunks:
-            try:
-                embedding = await generate_embedding(chunk.text)
-                
-                # Debug - verify embedding dimension
-                if len(embedding) != 1536:
-                    print(f"Warning: Embedding dimension mismatch. Got {len(embedding)}, expected 1536.")
-                    # Force correct dimensions by padding or truncating if needed
-                    if len(embedding) < 1536:
-                        # Pad with zeros if too short (shouldn't happen with Gemini)
-                        embedding = embedding + [0.0] * (1536 - len(embedding))
-                    else:
-                        # Truncate if too long 
-                        embedding = embedding[:1536]
-                        
-                embedding_id = f"{chunk.chunk_id}_emb"
-                
-                # Use a more deterministic ID to avoid collisions and enable updates
-                point_id = abs(hash(f"{doc_id}_{chunk.chunk_id}")) % (2**31 - 1)
-                
-                qdrant_client.upsert(
-                    collection_name="documents",
-                    points=[
-                        models.PointStruct(
-                            id=point_id,
-                            vector=embedding,
-                            payload={
-                                "doc_id": doc_id,
-                                "chunk_id": chunk.chunk_id,
-                                "page_num": chunk.page_num,
-                                "text": chunk.text,
-                                "filename": metadata.filename,
-                                "title": metadata.title
-                            }
-                        )
-                    ]
-                )
-                
-                embedding_ids.append(embedding_id)
-                chunk.embedding_id = embedding_id
-                
-            except Exception as chunk_error:
-                print(f"Error processing chunk {chunk.chunk_id}: {str(chunk_error)}")
-                # Continue with other chunks instead of failing the entire operation
-                continue
-                
+
+        # Embed every chunk up front in batched requests; a batch that keeps failing fails the upload
+        with llm_priority(Priority.BULK):
+            embeddings = await embed_batch_with_gemini(
+                [chunk.text for chunk in chunks],
+                task_type="RETRIEVAL_DOCUMENT",
+                on_progress=on_progress
+            )
+
+        points = []
+        for chunk, embedding in zip(chunks, embeddings):
+            # Debug - verify embedding dimension
+            if len(embedding) != 1536:
+                print(f"Warning: Embedding dimension mismatch. Got {len(embedding)}, expected 1536.")
+                # Force correct dimensions by padding or truncating if needed
+                if len(embedding) < 1536:
+                    # Pad with zeros if too short (shouldn't happen with Gemini)
+                    embedding = embedding + [0.0] * (1536 - len(embedding))
+                else:
+                    # Truncate if too long 
+                    embedding = embedding[:1536]
+
+            points.append(models.PointStruct(
+                id=point_id_for(doc_id, chunk.chunk_id),
+                vector=embedding,
+                payload={
+                    "doc_id": doc_id,
+                    "chunk_id": chunk.chunk_id,
+                    "page_num": chunk.page_num,
+                    "text": chunk.text,
+                    "filename": metadata.filename,
+                    "title": metadata.title
+                }
+            ))
+
+        # Upsert in batches, a few in flight at once; a batch that keeps failing fails the
+        # upload rather than leaving the document with missing vectors
+        semaphore = asyncio.Semaphore(settings.qdrant_upsert_concurrency)
+
+        async def upsert(batch_chunks: List[DocumentChunk], batch_points: List[models.PointStruct]) -> List[DocumentChunk]:
+            async with semaphore:
+                for attempt in range(settings.qdrant_upsert_retries + 1):
+                    try:
+                        await asyncio.to_thread(qdrant_client.upsert, collection_name="documents", points=batch_points)
+                        return batch_chunks
+                    except Exception as batch_error:
+                        if attempt == settings.qdrant_upsert_retries:
+                            raise
+                        delay = 2 ** attempt
+                        print(f"Error storing chunks {batch_chunks[0].chunk_id}..{batch_chunks[-1].chunk_id} "
+                              f"({str(batch_error)}), retrying in {delay}s")
+                        await asyncio.sleep(delay)
+
+        size = settings.qdrant_upsert_batch_size
+        stored = await asyncio.gather(*(
+            upsert(chunks[i:i + size], points[i:i + size]) for i in range(0, len(points), size)
+        ))
+        for chunk in (chunk for batch in stored for chunk in batch):
+            chunk.embedding_id = f"{chunk.chunk_id}_emb"
+            embedding_ids.append(chunk.embedding_id)
+
         if not embedding_ids:
             raise ValueError("No chunks were successfully embedded and stored")
             
@@ -151,10 +199,81 @@ async def store_in_vector_db(chunks: List[DocumentChunk], doc_id: str, metadata:
         print(f"Vector database storage error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error storing in vector database: {str(e)}")
 
-async def analyze_document(doc_text: str, metadata: DocumentMetadata) -> DocumentAnalysis:
+def _page_groups(pages: List[Dict[str, Any]], max_chars: int) -> List[List[Dict[str, Any]]]:
+    """Consecutive pages packed into groups of at most max_chars (a longer page gets a group of its own)"""
+    groups, current, size = [], [], 0
+    for page in pages:
+        if current and size + len(page["text"]) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(page)
+        size += len(page["text"])
+    if current:
+        groups.append(current)
+    return groups
+
+async def _summarize_section(label: str, text: str, metadata: DocumentMetadata) -> str:
+    # Keyed by content only, so re-uploads and shared boilerplate reuse earlier summaries
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cached = section_summary_cache.get(key)
+    if cached is not None:
+        return cached
+    summary_prompt = f"""
+    Summarize {label} of the document "{metadata.title or metadata.filename}".
+    Keep every concrete figure, date, name, risk and forward-looking statement.
+    Use at most {settings.document_summary_words} words and no preamble.
+
+    {text}
+    """
+    summary = (await analyze_with_gemini(summary_prompt)).strip()
+    section_summary_cache.set(key, summary, settings.document_summary_cache_ttl)
+    return summary
+
+async def summarize_document(pages: List[Dict[str, Any]], metadata: DocumentMetadata) -> str:
+    """Map-reduce a document down to text that fits one analysis prompt.
+
+    Page groups are summarized concurrently (bounded), and the summaries are
+    summarized again in groups until they fit, so every page is covered and wall
+    time grows with the depth of the reduction rather than the page count.
+    """
+    semaphore = asyncio.Semaphore(settings.document_summary_concurrency)
+    max_chars = settings.document_analysis_max_chars
+
+    async def summarize(label: str, text: str) -> str:
+        async with semaphore:
+            return await _summarize_section(label, text, metadata)
+
+    groups = _page_groups(pages, max_chars)
+    sections = await asyncio.gather(*(
+        summarize(
+            f"pages {group[0]['page_num']}-{group[-1]['page_num']}",
+            "\n\n".join(f"Page {page['page_num']}:\n{page['text']}" for page in group)
+        )
+        for group in groups
+    ))
+    labels = [f"Pages {group[0]['page_num']}-{group[-1]['page_num']}" for group in groups]
+    sections = [f"{label}: {summary}" for label, summary in zip(labels, sections)]
+
+    while sum(len(section) for section in sections) > max_chars and len(sections) > 1:
+        merged = _page_groups([{"text": section} for section in sections], max_chars)
+        if len(merged) == len(sections):
+            # Every summary is already at the budget on its own; pair them up so the loop converges
+            merged = [merged[i:i + 2] for i in range(0, len(merged), 2)]
+            merged = [[part for group in pair for part in group] for pair in merged]
+        sections = await asyncio.gather(*(
+            summarize("these section summaries", "\n\n".join(part["text"] for part in group))
+            for group in merged
+        ))
+    return "\n\n".join(sections)
+
+async def analyze_document(pages: List[Dict[str, Any]], metadata: DocumentMetadata) -> DocumentAnalysis:
     try:
-        max_text_length = 10000
-        truncated_text = doc_text[:max_text_length] + "..." if len(doc_text) > max_text_length else doc_text
+        with llm_priority(Priority.BACKGROUND):
+            doc_text = "\n\n".join(page["text"] for page in pages)
+            if len(doc_text) <= settings.document_analysis_max_chars:
+                content_label, content = "Document Content", doc_text
+            else:
+                content_label, content = "Section Summaries (covering the whole document)", await summarize_document(pages, metadata)
         
         analysis_prompt = f"""
         Please analyze this document and provide a comprehensive analysis:
@@ -163,8 +282,8 @@ async def analyze_document(doc_text: str, metadata: DocumentMetadata) -> Documen
         Filename: {metadata.filename}
         Pages: {metadata.num_pages}
         
-        Document Content:
-        {truncated_text}
+        {content_label}:
+        {content}
         
         Please provide:
         1. A concise summary of the document (3-5 sentences)
@@ -183,7 +302,8 @@ async def analyze_document(doc_text: str, metadata: DocumentMetadata) -> Documen
         }}
         """
         
-        analysis_text = await analyze_with_gemini(analysis_prompt)
+        with llm_priority(Priority.BACKGROUND):
+            analysis_text = await analyze_with_gemini(analysis_prompt)
         
         # Try to parse JSON response
         try:
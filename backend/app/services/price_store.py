@@ -0,0 +1,100 @@
+import os
+import re
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+
+# One fixed-width record per trading day, oldest first
+PRICE_DTYPE = np.dtype([
+    ("date", "<M8[D]"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("adjusted_close", "<f8"),
+    ("volume", "<f8"),
+])
+
+def parse_daily_series(payload: Dict[str, Any]) -> np.ndarray:
+    """Convert an Alpha Vantage TIME_SERIES_DAILY(_ADJUSTED) payload into PRICE_DTYPE records, oldest first"""
+    series = payload.get("Time Series (Daily)") or {}
+    bars = np.empty(len(series), dtype=PRICE_DTYPE)
+    for i, (day, row) in enumerate(sorted(series.items())):
+        close = float(row["4. close"])
+        bars[i] = (
+            np.datetime64(day, "D"),
+            float(row["1. open"]),
+            float(row["2. high"]),
+            float(row["3. low"]),
+            close,
+            float(row.get("5. adjusted close", close)),
+            float(row.get("6. volume", row.get("5. volume", 0))),
+        )
+    return bars
+
+def has_split_after(payload: Dict[str, Any], last: Optional[np.datetime64]) -> bool:
+    """Whether the payload has a split on a day after `last` (any split when last is None)"""
+    series = payload.get("Time Series (Daily)") or {}
+    return any(
+        float(row.get("8. split coefficient", 1)) != 1
+        for day, row in series.items()
+        if last is None or np.datetime64(day, "D") > last
+    )
+
+def adjusted_prices(bars: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(high, low, close) scaled by each bar's adjusted/raw close ratio, so splits do not break the series"""
+    close = bars["close"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(close > 0, bars["adjusted_close"] / close, 1.0)
+    return bars["high"] * factor, bars["low"] * factor, close * factor
+
+class PriceStore:
+    """Append-only daily OHLCV history per symbol.
+
+    Each symbol is a raw file of PRICE_DTYPE records read back through a read-only
+    np.memmap, so statistics over years of bars never parse JSON or copy the file.
+
+    Indicators are computed from adjusted prices (see adjusted_prices). A split rescales
+    the adjusted close of every earlier bar, so callers replace() the whole history when
+    one arrives. Dividends rescale it too, but only by the dividend yield, so stored
+    bars are not rewritten for them.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        safe_symbol = re.sub(r"[^A-Z0-9.\-]", "_", symbol.upper())
+        return os.path.join(self.directory, f"{safe_symbol}.bin")
+
+    def load(self, symbol: str) -> np.ndarray:
+        """Return the stored bars for symbol (oldest first); empty if nothing is stored yet"""
+        path = self._path(symbol)
+        if not os.path.exists(path) or os.path.getsize(path) < PRICE_DTYPE.itemsize:
+            return np.empty(0, dtype=PRICE_DTYPE)
+        count = os.path.getsize(path) // PRICE_DTYPE.itemsize
+        return np.memmap(path, dtype=PRICE_DTYPE, mode="r", shape=(count,))
+
+    def last_date(self, symbol: str) -> Optional[np.datetime64]:
+        bars = self.load(symbol)
+        return bars["date"][-1] if len(bars) else None
+
+    def append(self, symbol: str, bars: np.ndarray) -> int:
+        """Append only the bars newer than the last stored date. Returns the number of bars written."""
+        last = self.last_date(symbol)
+        bars = np.sort(bars, order="date")
+        if last is not None:
+            bars = bars[bars["date"] > last]
+        if len(bars):
+            with open(self._path(symbol), "ab") as f:
+                f.write(bars.astype(PRICE_DTYPE).tobytes())
+        return len(bars)
+
+    def replace(self, symbol: str, bars: np.ndarray) -> int:
+        """Overwrite the stored history with bars. Returns the number of bars written."""
+        path = self._path(symbol)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(np.sort(bars, order="date").astype(PRICE_DTYPE).tobytes())
+        os.replace(tmp_path, path)
+        return len(bars)
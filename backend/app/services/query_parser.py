@@ -1,4 +1,264 @@
-# Example (not generated unless requested)
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Local, rule-based classifier for stock queries. It resolves tickers and company
+# names against an in-memory trie and matches intent patterns, so most queries are
+# classified without a Gemini round trip. Callers fall back to the LLM when the
+# returned confidence is low.
+
+# (symbol, company names and common aliases)
+COMPANIES: List[Tuple[str, List[str]]] = [
+    ("AAPL", ["apple"]),
+    ("MSFT", ["microsoft"]),
+    ("GOOGL", ["alphabet", "google"]),
+    ("AMZN", ["amazon"]),
+    ("META", ["meta platforms", "meta", "facebook"]),
+    ("NVDA", ["nvidia"]),
+    ("TSLA", ["tesla"]),
+    ("BRK.B", ["berkshire hathaway", "berkshire"]),
+    ("JPM", ["jpmorgan", "jp morgan", "jpmorgan chase"]),
+    ("V", ["visa"]),
+    ("MA", ["mastercard"]),
+    ("JNJ", ["johnson & johnson", "johnson and johnson"]),
+    ("UNH", ["unitedhealth", "united health"]),
+    ("XOM", ["exxon mobil", "exxonmobil", "exxon"]),
+    ("CVX", ["chevron"]),
+    ("WMT", ["walmart"]),
+    ("PG", ["procter & gamble", "procter and gamble"]),
+    ("HD", ["home depot"]),
+    ("KO", ["coca-cola", "coca cola", "coke"]),
+    ("PEP", ["pepsico", "pepsi"]),
+    ("COST", ["costco"]),
+    ("DIS", ["disney", "walt disney"]),
+    ("NFLX", ["netflix"]),
+    ("ADBE", ["adobe"]),
+    ("CRM", ["salesforce"]),
+    ("ORCL", ["oracle"]),
+    ("INTC", ["intel"]),
+    ("AMD", ["advanced micro devices", "amd"]),
+    ("QCOM", ["qualcomm"]),
+    ("AVGO", ["broadcom"]),
+    ("TXN", ["texas instruments"]),
+    ("CSCO", ["cisco"]),
+    ("IBM", ["ibm", "international business machines"]),
+    ("MU", ["micron"]),
+    ("TSM", ["tsmc", "taiwan semiconductor"]),
+    ("ASML", ["asml"]),
+    ("SHOP", ["shopify"]),
+    ("UBER", ["uber"]),
+    ("ABNB", ["airbnb"]),
+    ("PYPL", ["paypal"]),
+    ("SQ", ["block inc", "square"]),
+    ("COIN", ["coinbase"]),
+    ("PLTR", ["palantir"]),
+    ("SNOW", ["snowflake"]),
+    ("BAC", ["bank of america"]),
+    ("WFC", ["wells fargo"]),
+    ("C", ["citigroup", "citi"]),
+    ("GS", ["goldman sachs", "goldman"]),
+    ("MS", ["morgan stanley"]),
+    ("AXP", ["american express", "amex"]),
+    ("BLK", ["blackrock"]),
+    ("SCHW", ["charles schwab", "schwab"]),
+    ("PFE", ["pfizer"]),
+    ("MRK", ["merck"]),
+    ("ABBV", ["abbvie"]),
+    ("LLY", ["eli lilly", "lilly"]),
+    ("MRNA", ["moderna"]),
+    ("BMY", ["bristol-myers squibb", "bristol myers"]),
+    ("AMGN", ["amgen"]),
+    ("GILD", ["gilead"]),
+    ("CVS", ["cvs health", "cvs"]),
+    ("TMO", ["thermo fisher"]),
+    ("ABT", ["abbott"]),
+    ("MCD", ["mcdonald's", "mcdonalds"]),
+    ("SBUX", ["starbucks"]),
+    ("NKE", ["nike"]),
+    ("LULU", ["lululemon"]),
+    ("TGT", ["target corporation"]),
+    ("LOW", ["lowe's", "lowes"]),
+    ("BA", ["boeing"]),
+    ("LMT", ["lockheed martin", "lockheed"]),
+    ("RTX", ["raytheon", "rtx"]),
+    ("GE", ["general electric"]),
+    ("CAT", ["caterpillar"]),
+    ("DE", ["john deere", "deere"]),
+    ("MMM", ["3m"]),
+    ("HON", ["honeywell"]),
+    ("UPS", ["united parcel service"]),
+    ("FDX", ["fedex"]),
+    ("F", ["ford", "ford motor"]),
+    ("GM", ["general motors"]),
+    ("RIVN", ["rivian"]),
+    ("T", ["at&t", "at and t"]),
+    ("VZ", ["verizon"]),
+    ("TMUS", ["t-mobile", "tmobile"]),
+    ("CMCSA", ["comcast"]),
+    ("SPOT", ["spotify"]),
+    ("SNAP", ["snapchat", "snap inc"]),
+    ("PINS", ["pinterest"]),
+    ("NEE", ["nextera", "nextera energy"]),
+    ("DUK", ["duke energy"]),
+    ("SO", ["southern company"]),
+    ("COP", ["conocophillips"]),
+    ("OXY", ["occidental"]),
+    ("SPY", ["s&p 500 etf", "spdr s&p 500"]),
+    ("QQQ", ["nasdaq 100 etf", "invesco qqq"]),
+]
+
+# Tickers that are also everyday words; they only count when written in capitals or as $CASHTAGS
+AMBIGUOUS_TICKERS = {
+    "C", "F", "T", "V", "MA", "MS", "GE", "SO", "DE", "LOW", "CAT", "KO", "HD", "GS", "BA", "MU", "PG",
+    "COST", "SNOW", "SNAP", "PINS", "SPOT", "DIS", "UPS", "COIN", "SHOP", "TGT"
+}
+
+COMPARISON_PATTERNS = [
+    r"\bcompar(e|ed|ing|ison)\b", r"\bvs\.?\b", r"\bversus\b", r"\bbetter\b.*\b(than|or)\b",
+    r"\bdifference between\b", r"\bwhich (one|is better|should i)\b", r"\bagainst\b",
+]
+LIST_PATTERNS = [
+    r"\btop\s+\d*\s*(stocks|companies|picks|shares)\b", r"\bbest\b.*\b(stocks|companies|shares|picks)\b",
+    r"\b(which|what) (stocks|companies|shares)\b", r"\blist (of )?(stocks|companies)\b",
+    r"\b(recommend|suggest)\w*\b.*\b(stocks|companies|shares)\b",
+    r"\b(dividend|growth|value|penny|blue[- ]chip|tech|energy|bank|ai|ev)\s+stocks\b",
+    r"\bstocks (to buy|for|with|in|that)\b", r"\bscreen(er|ing)?\b",
+]
+SINGLE_PATTERNS = [
+    r"\b(price|outlook|forecast|analysis|analyze|valuation|earnings|dividend|rsi|p/?e)\b",
+    r"\b(should i|is it a good time to) (buy|sell|hold)\b", r"\b(buy|sell|hold)\b",
+    r"\bhow (is|are|has|did)\b", r"\bwhat about\b",
+]
+# Questions about a concept rather than a security; without these a SINGLE-style question
+# that resolves no symbol is assumed to be about a company the table does not know
+CONCEPT_PATTERNS = [
+    r"^(what|how) (is|are) (a|an)\b", r"\bexplain\b", r"\bwhat does\b.*\bmean\b", r"\bhow (do|does)\b.*\bwork\b",
+    r"\b(inflation|interest rates?|recession|fed|federal reserve|etfs?|index funds?|diversif\w*|portfolio|bonds?)\b",
+]
+GENERAL_PATTERNS = [
+    r"^(what|how|why|when) (is|are|does|do|should)\b", r"\bexplain\b", r"\bwhat does\b.*\bmean\b",
+    r"\b(inflation|interest rates?|recession|fed|federal reserve|etf|index fund|diversif\w*|portfolio|market cap|bonds?)\b",
+]
+
+# All-caps words that are not tickers, so they are not taken for an unknown symbol
+COMMON_ACRONYMS = {
+    "AI", "EV", "ETF", "ETFS", "IPO", "CEO", "CFO", "USA", "US", "UK", "EU", "GDP", "CPI", "FED", "SEC", "RSI",
+    "EPS", "PE", "MACD", "ATR", "SMA", "EMA", "ROI", "ROE", "YOY", "QOQ", "YTD", "ATH", "FCF", "DCF", "REIT",
+    "REITS", "ESG", "IRA", "NYSE", "ADR", "API", "INC", "LLC", "VS", "OK",
+}
+_TICKER_LIKE = re.compile(r"^[A-Z]{2,5}(\.[A-Z])?$")
+
+class SymbolTrie:
+    """Word-level trie mapping company names to symbols (bare tickers are matched separately)"""
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, words: List[str], symbol: str):
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        node["$symbol"] = symbol
+
+    def longest_match(self, tokens: List[str], start: int) -> Tuple[Optional[str], int]:
+        """Longest name starting at tokens[start]; returns (symbol, number of tokens consumed)"""
+        node = self._root
+        match, length = None, 0
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if "$symbol" in node:
+                match, length = node["$symbol"], i - start + 1
+        return match, length
+
+_WORD = r"\$?[A-Za-z0-9&'’.\-]+"
+_POSSESSIVE = re.compile(r"['’]s$", re.IGNORECASE)
+
+def _clean_word(word: str) -> str:
+    """Drop surrounding dots and quotes and a possessive 's, so Tesla's matches tesla"""
+    return _POSSESSIVE.sub("", word.strip(".'’")).strip(".'’")
+
+def _tokenize(text: str) -> List[str]:
+    return [_clean_word(word) for word in re.findall(_WORD, text.lower())]
+
+def _build_trie() -> Tuple[SymbolTrie, Dict[str, str]]:
+    trie = SymbolTrie()
+    for symbol, names in COMPANIES:
+        for name in names:
+            trie.add(_tokenize(name), symbol)
+    return trie, {symbol: symbol for symbol, _ in COMPANIES}
+
+_trie, _symbols = _build_trie()
+
+def extract_symbols(query: str) -> List[str]:
+    """Tickers and company names mentioned in the query, in order of appearance"""
+    return _scan(query)[0]
+
+def _scan(query: str) -> Tuple[List[str], List[str]]:
+    """(known symbols, ticker-like words that are not in COMPANIES), in order of appearance"""
+    words = [_clean_word(word) for word in re.findall(_WORD, query)]
+    tokens = [word.lstrip("$").lower() for word in words]
+    found: List[str] = []
+    unknown: List[str] = []
+    i = 0
+    while i < len(tokens):
+        # Company names first, longest match so "bank of america" wins over shorter names
+        symbol, length = _trie.longest_match(tokens, i)
+        if symbol:
+            found.append(symbol)
+            i += length
+            continue
+        candidate = tokens[i].upper()
+        if candidate in _symbols:
+            explicit = words[i].startswith("$") or words[i].isupper()
+            if explicit or (candidate not in AMBIGUOUS_TICKERS and len(candidate) > 1):
+                found.append(candidate)
+        elif _TICKER_LIKE.match(candidate) and (
+            words[i].startswith("$") or (words[i].isupper() and candidate not in COMMON_ACRONYMS)
+        ):
+            unknown.append(candidate)
+        i += 1
+    return list(dict.fromkeys(found)), list(dict.fromkeys(unknown))
+
+def _matches(patterns: List[str], text: str) -> bool:
+    return any(re.search(pattern, text) for pattern in patterns)
+
+def classify_query(query: str) -> Dict:
+    """Classify a stock query locally. Returns type, symbols, intent and a 0-1 confidence.
+
+    Queries naming a ticker outside COMPANIES, or asking about a security without
+    resolving one, get a confidence low enough for the caller to ask the LLM.
+    """
+    text = query.lower().strip()
+    symbols, unknown = _scan(query)
+    comparison = _matches(COMPARISON_PATTERNS, text)
+    listing = _matches(LIST_PATTERNS, text)
+
+    if len(symbols) >= 2:
+        query_type, confidence = "COMPARISON", 0.95 if comparison else 0.75
+        intent = "compare"
+    elif len(symbols) == 1:
+        if comparison or listing:
+            # e.g. "compare Apple with its peers" or "stocks like Tesla"; let the LLM decide
+            query_type, confidence = ("COMPARISON" if comparison else "LIST"), 0.45
+        else:
+            query_type, confidence = "SINGLE", 0.9 if _matches(SINGLE_PATTERNS, text) else 0.8
+        intent = "analyze"
+    elif listing:
+        query_type, confidence, intent = "LIST", 0.85, "screen"
+    elif unknown or (_matches(SINGLE_PATTERNS, text) and not _matches(CONCEPT_PATTERNS, text)):
+        query_type, confidence, intent = ("COMPARISON" if comparison else "SINGLE"), 0.3, "analyze"
+    elif _matches(GENERAL_PATTERNS, text):
+        query_type, confidence, intent = "GENERAL", 0.8, "educate"
+    else:
+        query_type, confidence, intent = "GENERAL", 0.4, "query"
+
+    if unknown:
+        # Some of the symbols asked about could not be resolved locally
+        confidence = min(confidence, 0.3)
+    return {"type": query_type, "symbols": symbols, "intent": intent, "confidence": confidence}
+
 async def parse_query(query: str, context: str = "stock") -> dict:
-    # Custom parsing logic (e.g., regex, NLP)
-    return {"type": "GENERAL", "symbols": [], "intent": "query"}
\ No newline at end of file
+    if context != "stock":
+        return {"type": "GENERAL", "symbols": [], "intent": "query", "confidence": 0.0}
+    return classify_query(query)
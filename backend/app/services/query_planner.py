@@ -0,0 +1,107 @@
+import json
+import re
+from typing import Dict, List, Optional
+from app.config import settings
+from app.schemas.query import QueryPlan, QueryType
+from app.services.alphavantage import STOCK_DATA_FIELDS
+from app.services.gemini import analyze_with_gemini
+from app.services.query_parser import classify_query
+
+# One planning step per stock query: the local parser when it is confident, otherwise a
+# single schema-constrained LLM call that returns type, symbols and metrics together
+# (replacing the chained detect_query_type and symbol-extraction prompts).
+
+MAX_SYMBOLS = 5
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "query_type": {"type": "string", "enum": ["SINGLE", "LIST", "COMPARISON", "GENERAL"]},
+        "symbols": {"type": "array", "items": {"type": "string"}},
+        "metrics": {"type": "array", "items": {"type": "string", "enum": sorted(STOCK_DATA_FIELDS)}},
+    },
+    "required": ["query_type", "symbols", "metrics"],
+}
+
+METRIC_PATTERNS: Dict[str, str] = {
+    "pe_ratio": r"\bp/?e\b|price[- ]to[- ]earnings|valuation|overvalued|undervalued",
+    "eps": r"\beps\b|earnings per share",
+    "dividend_yield": r"dividend|yield|income",
+    "market_cap": r"market cap|large[- ]cap|small[- ]cap|mid[- ]cap",
+    "beta": r"\bbeta\b|volatil",
+    "revenue_growth": r"revenue|sales|growth",
+    "debt_to_equity": r"\bdebt\b|leverage",
+    "rsi": r"\brsi\b|overbought|oversold|momentum",
+    "50d_sma": r"moving average|\bsma\b|trend",
+    "high_52week": r"52[- ]week|all[- ]time high",
+    "low_52week": r"52[- ]week",
+    "sentiment_score": r"news|sentiment|headline",
+}
+
+def local_metrics(query: str) -> List[str]:
+    text = query.lower()
+    return [metric for metric, pattern in METRIC_PATTERNS.items() if re.search(pattern, text)]
+
+def _needs_llm(query_type: QueryType, symbols: List[str]) -> bool:
+    if query_type == QueryType.SINGLE:
+        return not symbols
+    if query_type == QueryType.COMPARISON:
+        return len(symbols) < 2
+    # LIST queries need suggested symbols, which only the model can provide
+    return query_type == QueryType.LIST
+
+def _runnable_type(query_type: QueryType, symbols: List[str]) -> QueryType:
+    """Downgrade a plan whose symbols cannot support its query type"""
+    if query_type == QueryType.COMPARISON and len(symbols) == 1:
+        return QueryType.SINGLE
+    if query_type != QueryType.GENERAL and not symbols:
+        return QueryType.GENERAL
+    return query_type
+
+def _clean_symbols(symbols: List[str]) -> List[str]:
+    cleaned = [re.sub(r"[^A-Z0-9.\-]", "", symbol.upper()) for symbol in symbols]
+    return list(dict.fromkeys(symbol for symbol in cleaned if symbol))[:MAX_SYMBOLS]
+
+async def _llm_plan(query: str) -> Optional[Dict]:
+    planner_prompt = f"""
+    Plan how to answer this stock-related query: "{query}"
+
+    - query_type: SINGLE (one specific stock), LIST (stocks matching some criteria),
+      COMPARISON (several specific stocks compared) or GENERAL (markets or investing in general)
+    - symbols: ticker symbols mentioned in the query; for LIST queries suggest 3-5 relevant tickers
+    - metrics: the data fields the query is specifically about, if any
+    """
+    try:
+        return json.loads(await analyze_with_gemini(planner_prompt, response_schema=PLAN_SCHEMA))
+    except Exception as e:
+        print(f"Query planner call failed, falling back to the local parse: {str(e)}")
+        return None
+
+async def plan_query(query: str, query_type: Optional[QueryType] = None, symbols: Optional[List[str]] = None) -> QueryPlan:
+    """Typed plan for a stock query. Explicit query_type (other than GENERAL) and symbols from the request win."""
+    requested_type = query_type if query_type and query_type != QueryType.GENERAL else None
+    requested_symbols = _clean_symbols([s for s in symbols or [] if s != "string"])
+
+    parsed = classify_query(query)
+    plan_type = requested_type or QueryType(parsed["type"].lower())
+    plan_symbols = requested_symbols or _clean_symbols(parsed["symbols"])
+    confident = requested_type is not None or parsed["confidence"] >= settings.query_parser_confidence_threshold
+
+    if confident and not _needs_llm(plan_type, plan_symbols):
+        return QueryPlan(query_type=plan_type, symbols=plan_symbols, metrics=local_metrics(query), source="local")
+
+    planned = await _llm_plan(query)
+    if planned is None:
+        # Without a plan, only run what the local parse supports
+        plan_type = _runnable_type(plan_type, plan_symbols)
+        return QueryPlan(query_type=plan_type, symbols=plan_symbols, metrics=local_metrics(query), source="local")
+
+    try:
+        llm_type = QueryType(str(planned.get("query_type", "GENERAL")).lower())
+    except ValueError:
+        llm_type = QueryType.GENERAL
+    plan_type = requested_type or llm_type
+    plan_symbols = requested_symbols or _clean_symbols(planned.get("symbols") or []) or plan_symbols
+    metrics = [metric for metric in planned.get("metrics") or [] if metric in STOCK_DATA_FIELDS] or local_metrics(query)
+    plan_type = _runnable_type(plan_type, plan_symbols)
+    return QueryPlan(query_type=plan_type, symbols=plan_symbols, metrics=metrics, source="llm")
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class TokenBucket:
+    """Process-wide token bucket; callers wait for a token instead of exceeding the upstream quota"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> bool:
+        """Take one token, sleeping until one is available. Returns True if the caller was throttled."""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            throttled = False
+            while self._tokens < 1:
+                throttled = True
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+            return throttled
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one underlying call"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn() once per key at a time. Returns (result, shared) where shared is True for followers."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shield so one cancelled caller does not cancel the call the others are waiting on
+        return await asyncio.shield(call), shared
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,15 @@
+import json
+from typing import Any, AsyncIterator
+from fastapi.responses import StreamingResponse
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so tokens reach the browser as they are generated
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,45 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from contextlib import suppress
+from typing import Tuple
+from fastapi import HTTPException, UploadFile
+from app.config import settings
+
+async def spool_upload(file: UploadFile) -> Tuple[str, int, str]:
+    """Stream an upload to a file under upload_spool_dir without holding it in memory.
+
+    Returns the spool path, size and sha256 hex digest of the content. Uploads larger than upload_max_bytes are
+    rejected with 413 as soon as the limit is crossed, and partial files removed. Hashing and disk writes run
+    in a worker thread so large uploads do not block the event loop.
+    """
+    os.makedirs(settings.upload_spool_dir, exist_ok=True)
+    path = os.path.join(settings.upload_spool_dir, f"{uuid.uuid4()}.part")
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with open(path, "wb") as f:
+            def write(chunk: bytes):
+                digest.update(chunk)
+                f.write(chunk)
+
+            while True:
+                chunk = await file.read(settings.upload_chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.upload_max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {settings.upload_max_bytes / (1024 * 1024):g} MB upload limit"
+                    )
+                await asyncio.to_thread(write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        return path, size, digest.hexdigest()
+    except BaseException:
+        # open() itself may have failed, in which case there is nothing to remove
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        raise
@@ -4,11 +4,11 @@ from app.config import settings
 
 async def test_alphavantage():
     """Simple test for AlphaVantage API"""
-    # Basic API endpoint for a simple stock quote
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=NVDA&apikey=IQALOI8LRDP85MNM"
+    # Basic API endpoint for a simple stock quote; set ALPHAVANTAGE_BASE_URL to use the offline stand-in
+    params = {"function": "GLOBAL_QUOTE", "symbol": "NVDA", "apikey": settings.alphavantage_api_key}
     
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await client.get(settings.alphavantage_base_url, params=params)
         data = response.json()
         
         print("API Response:")
@@ -17,7 +17,7 @@ async def test_alphavantage():
         # Check if the response has the expected structure
         if "Global Quote" in data:
             print("\nAPI test successful!")
-            print(f"Current price of MSFT: {data['Global Quote'].get('05. price', 'Not available')}")
+            print(f"Current price of NVDA: {data['Global Quote'].get('05. price', 'Not available')}")
         else:
             print("\nAPI test failed or response format unexpected")
             print("Check your API key or if you've exceeded your API call limits")
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import httpx
+import pytest
+
+# Settings are read when app.config is imported, so the offline configuration has to
+# be in place before any test module imports the app: a throwaway SQLite database,
+# in-memory caches and the local LLM provider instead of Gemini.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORAGE_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+sys.path.insert(0, BACKEND_DIR)
+
+for name, value in {
+    "DATABASE_URL": f"sqlite:///{os.path.join(STORAGE_DIR, 'app.db')}",
+    "JWT_SECRET": "test-secret",
+    "ALPHAVANTAGE_API_KEY": "test",
+    "ALPHAVANTAGE_CACHE_PATH": "",
+    "PRICE_STORE_PATH": os.path.join(STORAGE_DIR, "prices"),
+    "LLM_PROVIDER": "local",
+    "LOCAL_LLM_LATENCY_MS": "0",
+    "EMBEDDING_CACHE_PATH": "",
+    "DOCUMENT_SUMMARY_CACHE_PATH": "",
+    "INGEST_JOB_DIR": os.path.join(STORAGE_DIR, "ingest"),
+    "UPLOAD_SPOOL_DIR": os.path.join(STORAGE_DIR, "uploads"),
+}.items():
+    os.environ.setdefault(name, value)
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    """Serve Alpha Vantage calls from alphavantage_standin in-process, with fresh client state.
+
+    Returns the stand-in module so tests can set its ERROR_RATE or QUOTA_RATE.
+    """
+    import alphavantage_standin
+    from app.config import settings
+    from app.services import alphavantage, http_client
+    from app.services.price_store import PriceStore
+    from app.services.rate_limiter import TokenBucket
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=alphavantage_standin.app))
+    monkeypatch.setattr(http_client, "_client", client)
+    monkeypatch.setattr(settings, "alphavantage_base_url", "http://standin/query")
+    monkeypatch.setattr(alphavantage, "alpha_vantage_limiter", TokenBucket(100_000, 1000))
+    monkeypatch.setattr(alphavantage, "price_store", PriceStore(str(tmp_path / "prices")))
+    monkeypatch.setattr(alphavantage_standin, "ERROR_RATE", 0.0)
+    monkeypatch.setattr(alphavantage_standin, "QUOTA_RATE", 0.0)
+    alphavantage.alpha_vantage_cache.clear()
+    alphavantage.alpha_vantage_breakers.clear()
+    alphavantage._price_synced_at.clear()
+    alphavantage._price_sync_ok.clear()
+    alphavantage.alpha_vantage_stats.update(dict.fromkeys(alphavantage.alpha_vantage_stats, 0))
+    return alphavantage_standin
@@ -0,0 +1,74 @@
+import time
+from app.services.cache import TTLCache
+
+def test_get_returns_fresh_entries_and_counts_hits():
+    cache = TTLCache(max_entries=10)
+    cache.set("a", {"price": 1}, ttl=60)
+
+    assert cache.get("a") == {"price": 1}
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+def test_expired_entry_is_served_stale_within_stale_ttl():
+    cache = TTLCache(stale_ttl=60)
+    cache.set("a", 1, ttl=-1)
+
+    assert cache.get("a") is None
+    assert cache.get_stale("a")[0] == 1
+
+def test_expired_entry_without_stale_ttl_is_dropped():
+    cache = TTLCache()
+    cache.set("a", 1, ttl=-1)
+
+    assert cache.get("a") is None
+    assert cache.get_stale("a") is None
+
+def test_entries_survive_a_restart_with_a_backing_store(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = TTLCache(path=path, stale_ttl=60)
+    first.set("a", [1, 2], ttl=60)
+    first.set("b", "old", ttl=-1)
+    first.flush()
+
+    cache = TTLCache(path=path, stale_ttl=60)
+    assert cache.get("a") == [1, 2]
+    assert cache.get_stale("b")[0] == "old"
+
+def test_disk_writes_are_deferred_and_batched(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TTLCache(path=path, flush_interval=60)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.delete("b")
+
+    assert TTLCache(path=path).get("a") is None
+    cache.flush()
+    restarted = TTLCache(path=path)
+    assert restarted.get("a") == 1
+    assert restarted.get("b") is None
+
+def test_queued_writes_are_committed_in_the_background(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TTLCache(path=path, flush_interval=0.01).set("a", 1, ttl=60)
+    time.sleep(0.2)
+
+    assert TTLCache(path=path).get("a") == 1
+
+def test_evicted_entries_are_read_back_before_they_are_committed(tmp_path):
+    cache = TTLCache(max_entries=1, path=str(tmp_path / "cache.sqlite3"), flush_interval=60)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+
+    assert cache.get("a") == 1
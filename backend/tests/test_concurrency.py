@@ -0,0 +1,99 @@
+import asyncio
+from app.services.concurrency import Priority, PriorityScheduler, llm_context, llm_priority
+
+async def run_queued(scheduler: PriorityScheduler, waiters, cancel=()):
+    """Hold the only slot while `waiters` queue up, then release it and return the order they ran in.
+
+    Waiters named in `cancel` are cancelled while still queued.
+    """
+    order = []
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot(Priority.INTERACTIVE, "holder"):
+            await release.wait()
+
+    async def waiter(name, priority, user):
+        async with scheduler.slot(priority, user):
+            order.append(name)
+
+    holding = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    tasks = {}
+    for name, priority, user in waiters:
+        tasks[name] = asyncio.create_task(waiter(name, priority, user))
+        await asyncio.sleep(0)
+    for name in cancel:
+        tasks[name].cancel()
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holding, *tasks.values(), return_exceptions=True)
+    return order
+
+def test_higher_priority_waiters_go_first():
+    scheduler = PriorityScheduler("test", limit=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("bulk", Priority.BULK, "a"),
+        ("background", Priority.BACKGROUND, "a"),
+        ("interactive", Priority.INTERACTIVE, "a"),
+    ]))
+
+    assert order == ["interactive", "background", "bulk"]
+
+def test_users_are_served_round_robin_within_a_priority():
+    scheduler = PriorityScheduler("test", limit=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("a1", Priority.BULK, "a"),
+        ("a2", Priority.BULK, "a"),
+        ("a3", Priority.BULK, "a"),
+        ("b1", Priority.BULK, "b"),
+        ("c1", Priority.BULK, "c"),
+    ]))
+
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+def test_cancelled_waiters_leave_the_queue():
+    scheduler = PriorityScheduler("test", limit=1)
+    order = asyncio.run(run_queued(scheduler, [
+        ("a1", Priority.BULK, "a"),
+        ("b1", Priority.BULK, "b"),
+        ("a2", Priority.BULK, "a"),
+    ], cancel=["b1"]))
+
+    assert order == ["a1", "a2"]
+    assert scheduler.waiting() == 0
+    assert scheduler.active == 0
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    scheduler = PriorityScheduler("test", limit=1)
+
+    async def run():
+        order = []
+
+        async def waiter(name):
+            async with scheduler.slot(Priority.BULK, name):
+                order.append(name)
+
+        async with scheduler.slot(Priority.INTERACTIVE, "holder"):
+            first = asyncio.create_task(waiter("first"))
+            second = asyncio.create_task(waiter("second"))
+            await asyncio.sleep(0)
+        # Leaving the block handed the slot to "first"; cancel it before it runs
+        first.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        return order
+
+    assert asyncio.run(run()) == ["second"]
+    assert scheduler.active == 0
+
+def test_slot_defaults_to_the_callers_context():
+    scheduler = PriorityScheduler("test", limit=1)
+
+    async def run():
+        with llm_context("alice"), llm_priority(Priority.BULK):
+            order = await run_queued(scheduler, [("bulk", None, None), ("interactive", Priority.INTERACTIVE, "bob")])
+        return order, scheduler.stats()["priorities"]
+
+    order, priorities = asyncio.run(run())
+    assert order == ["interactive", "bulk"]
+    assert priorities["bulk"]["completed"] == 1
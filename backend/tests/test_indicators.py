@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from app.services.indicators import atr, ema, latest_snapshot, macd, rsi, stack_series
+
+rng = np.random.default_rng(7)
+CLOSE = 100 + np.cumsum(rng.normal(0, 1, 120))
+HIGH = CLOSE + rng.uniform(0, 2, 120)
+LOW = CLOSE - rng.uniform(0, 2, 120)
+
+def wilder_reference(values, period):
+    """Textbook Wilder smoothing: a simple average seed, then (previous * (n - 1) + value) / n"""
+    result = [np.nan] * len(values)
+    average = sum(values[:period]) / period
+    result[period - 1] = average
+    for t in range(period, len(values)):
+        average = (average * (period - 1) + values[t]) / period
+        result[t] = average
+    return np.array(result)
+
+def ema_reference(values, span):
+    alpha = 2 / (span + 1)
+    result = [values[0]]
+    for value in values[1:]:
+        result.append(alpha * value + (1 - alpha) * result[-1])
+    return np.array(result)
+
+def test_rsi_matches_wilder_smoothing():
+    delta = np.diff(CLOSE)
+    gain = wilder_reference(np.clip(delta, 0, None), 14)
+    loss = wilder_reference(np.clip(-delta, 0, None), 14)
+    expected = 100 - 100 / (1 + gain / loss)
+
+    result = rsi(CLOSE)
+    assert np.isnan(result[:14]).all()
+    np.testing.assert_allclose(result[14:], expected[13:])
+
+def test_rsi_is_100_without_losses():
+    assert rsi(np.arange(1.0, 31.0))[-1] == 100.0
+
+def test_macd_is_the_difference_of_fast_and_slow_emas():
+    line, signal_line, histogram = macd(CLOSE)
+    expected_line = ema_reference(CLOSE, 12) - ema_reference(CLOSE, 26)
+
+    np.testing.assert_allclose(line, expected_line)
+    np.testing.assert_allclose(signal_line, ema_reference(expected_line, 9))
+    np.testing.assert_allclose(histogram, line - signal_line)
+
+def test_atr_matches_wilder_smoothing_of_true_range():
+    previous_close = np.concatenate([[np.nan], CLOSE[:-1]])
+    true_range = np.fmax(HIGH - LOW, np.fmax(np.abs(HIGH - previous_close), np.abs(LOW - previous_close)))
+
+    result = atr(HIGH, LOW, CLOSE)
+    assert np.isnan(result[:13]).all()
+    np.testing.assert_allclose(result[13:], wilder_reference(true_range, 14)[13:])
+
+def test_padded_rows_match_their_one_dimensional_results():
+    short = CLOSE[-40:]
+    matrix = stack_series([CLOSE, short])
+
+    np.testing.assert_allclose(rsi(matrix)[1, -40:], rsi(short))
+    np.testing.assert_allclose(ema(matrix, 20)[1, -40:], ema(short, 20))
+    assert np.isnan(rsi(matrix)[1, :-40]).all()
+
+def test_latest_snapshot_takes_the_last_value_per_row():
+    snapshot = latest_snapshot(stack_series([HIGH]), stack_series([LOW]), stack_series([CLOSE]))
+
+    assert snapshot["rsi_14"][0] == pytest.approx(rsi(CLOSE)[-1])
+    assert snapshot["atr_14"][0] == pytest.approx(atr(HIGH, LOW, CLOSE)[-1])
+    assert snapshot["sma_50"][0] == pytest.approx(CLOSE[-50:].mean())
+    assert snapshot["high_30"][0] == CLOSE[-30:].max()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+from datetime import date
+import numpy as np
+import pytest
+import alphavantage_standin
+from app.config import settings
+from app.services import alphavantage
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.indicators import rsi
+from app.services.price_store import PRICE_DTYPE, parse_daily_series
+from app.services.rate_limiter import TokenBucket
+
+HISTORY_FIELDS = {"current_price", "rsi", "30d_high"}
+
+def store_recorded_history(symbol: str):
+    """Seed the price store with the fixture's bars, which end well before today"""
+    with open(os.path.join(alphavantage_standin.FIXTURE_DIR, "TIME_SERIES_DAILY_ADJUSTED.json")) as f:
+        alphavantage.price_store.append(symbol, parse_daily_series(json.load(f)))
+
+def test_fresh_sync_is_not_stale(standin):
+    stock = asyncio.run(alphavantage.fetch_stock_data("IBM", HISTORY_FIELDS))
+
+    assert stock.current_price > 0
+    assert stock.additional_data["rsi"] > 0
+    assert not stock.stale
+    assert stock.stale_sections is None
+
+def test_failed_sync_flags_stored_history_stale(standin):
+    store_recorded_history("IBM")
+    alphavantage.alpha_vantage_breakers["TIME_SERIES_DAILY_ADJUSTED"] = CircuitBreaker(1, 60)
+    standin.ERROR_RATE = 1.0
+
+    async def run():
+        # A second call finds the circuit open; the history must still be flagged
+        first = await alphavantage.fetch_stock_data("IBM", {"rsi"})
+        alphavantage._price_synced_at.clear()
+        return first, await alphavantage.fetch_stock_data("IBM", {"rsi"})
+
+    for stock in asyncio.run(run()):
+        assert stock.stale
+        assert stock.stale_sections == ["TIME_SERIES_DAILY_ADJUSTED"]
+        assert stock.additional_data["rsi"] > 0
+
+def test_stale_flag_clears_once_a_sync_succeeds(standin):
+    store_recorded_history("IBM")
+    standin.ERROR_RATE = 1.0
+    assert asyncio.run(alphavantage.fetch_stock_data("IBM", {"rsi"})).stale
+
+    standin.ERROR_RATE = 0.0
+    alphavantage._price_synced_at.clear()
+    assert not asyncio.run(alphavantage.fetch_stock_data("IBM", {"rsi"})).stale
+
+def test_expired_quote_is_served_stale_while_the_circuit_is_open(standin):
+    key = alphavantage._cache_key("GLOBAL_QUOTE", "IBM")
+    payload = asyncio.run(alphavantage.fetch_alpha_vantage_data("GLOBAL_QUOTE", "IBM"))
+    alphavantage.alpha_vantage_cache.set(key, payload, ttl=-1)
+    breaker = alphavantage.alpha_vantage_breakers["GLOBAL_QUOTE"] = CircuitBreaker(1, 60)
+    breaker.record_failure()
+
+    stock = asyncio.run(alphavantage.fetch_stock_data("IBM", {"current_price"}))
+    assert stock.current_price == float(payload["Global Quote"]["05. price"])
+    assert stock.stale_sections == ["GLOBAL_QUOTE"]
+
+def test_throttled_requests_are_delayed_not_timed_out(standin, monkeypatch):
+    # 20 requests a second: the last of 12 calls waits ~0.55s for a token, past the 0.2s timeout
+    monkeypatch.setattr(alphavantage, "alpha_vantage_limiter", TokenBucket(rate_per_minute=1200, burst=1))
+    monkeypatch.setattr(settings, "alphavantage_section_timeout", 0.2)
+    symbols = ["IBM", "AAPL", "MSFT", "NVDA", "AMZN", "META"]
+
+    async def run():
+        return await asyncio.gather(*(alphavantage.fetch_stock_data(symbol, {"current_price", "name"}) for symbol in symbols))
+
+    stocks = asyncio.run(run())
+    assert [stock.symbol for stock in stocks] == symbols
+    assert all(stock.current_price > 0 and not stock.stale for stock in stocks)
+    assert alphavantage.alpha_vantage_stats["errors"] == 0
+
+def test_price_history_stats_use_the_trailing_window():
+    days = 6500
+    bars = np.zeros(days, dtype=PRICE_DTYPE)
+    bars["date"] = np.datetime64("2000-01-03") + np.arange(days)
+    bars["close"] = 100 + np.cumsum(np.random.default_rng(3).normal(0, 1, days))
+    bars["high"], bars["low"] = bars["close"] + 1, bars["close"] - 1
+    bars["adjusted_close"] = bars["close"]
+
+    stats = alphavantage._price_history_stats(bars)
+    assert stats == alphavantage._price_history_stats(bars[-alphavantage.INDICATOR_HISTORY_DAYS:])
+    assert stats["high_52week"] == bars["close"][-252:].max()
+    assert stats["rsi"] == pytest.approx(rsi(bars["close"][-alphavantage.INDICATOR_HISTORY_DAYS:])[-1])
+
+def daily_payload(days: np.ndarray, split_day: int) -> dict:
+    """A daily series trading at 100 (adjusted) with a 2:1 split on days[split_day]"""
+    series = {}
+    for i, day in enumerate(days):
+        close = 200.0 if i < split_day else 100.0
+        series[str(day)] = {
+            "1. open": str(close), "2. high": str(close + 2), "3. low": str(close - 2), "4. close": str(close),
+            "5. adjusted close": "100.0", "6. volume": "1000",
+            "7. dividend amount": "0.0", "8. split coefficient": "2.0" if i == split_day else "1.0",
+        }
+    return {"Meta Data": {"2. Symbol": "SPLT"}, "Time Series (Daily)": series}
+
+def test_split_rewrites_the_stored_history(standin, monkeypatch):
+    days = np.busday_offset(np.datetime64(date.today(), "D"), np.arange(-260, 0), roll="forward")
+    payload = daily_payload(days, split_day=250)
+    requests = []
+
+    async def fetch(function, symbol, outputsize):
+        requests.append(outputsize)
+        series = payload["Time Series (Daily)"]
+        keep = sorted(series)[-100:] if outputsize == "compact" else sorted(series)
+        return {**payload, "Time Series (Daily)": {day: series[day] for day in keep}}
+    monkeypatch.setattr(alphavantage, "fetch_alpha_vantage_data", fetch)
+    # Stored before the split, when the adjusted close still equalled the raw close
+    before = {day: {**row, "5. adjusted close": row["4. close"]} for day, row in list(payload["Time Series (Daily)"].items())[:245]}
+    alphavantage.price_store.append("SPLT", parse_daily_series({"Time Series (Daily)": before}))
+
+    stock = asyncio.run(alphavantage.fetch_stock_data("SPLT", {"high_52week", "rsi"}))
+    bars = alphavantage.price_store.load("SPLT")
+
+    assert requests == ["compact", "full"]
+    assert len(bars) == 260
+    assert (bars["adjusted_close"] == 100).all()
+    assert stock.high_52week == 100
+    assert not stock.stale
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import io
+import pytest
+from fastapi import HTTPException, UploadFile
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+import app.models.activity_log, app.models.chat_message, app.models.stock_cart, app.models.trade_request, app.models.user
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.models.pdf_document import PDFDocument
+from app.schemas.pdf_document import JobStatus
+from app.services import ingestion, pdf_processor, uploads
+from app.services.ingestion import IngestionQueue
+from app.services.uploads import spool_upload
+
+def make_pdf(text: str, pages: int = 3) -> bytes:
+    """A minimal text PDF with `pages` pages of `text`"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        body = "BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(f"(Page {page + 1} line {line}: {text}) '" for line in range(30)) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {pages} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+@pytest.fixture(autouse=True)
+def vector_db(monkeypatch):
+    client = QdrantClient(":memory:")
+    client.create_collection("documents", vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE))
+    monkeypatch.setattr(pdf_processor, "qdrant_client", client)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.query(PDFDocument).delete()
+        db.commit()
+    return client
+
+@pytest.fixture
+def upload(tmp_path):
+    """Spool a PDF like the upload endpoint does; returns (path, sha256)"""
+    count = 0
+
+    def spool(content: bytes):
+        nonlocal count
+        count += 1
+        path = tmp_path / f"upload-{count}.part"
+        path.write_bytes(content)
+        return str(path), hashlib.sha256(content).hexdigest()
+    return spool
+
+def counting(monkeypatch, name: str):
+    """Wrap an ingestion stage function and count its calls"""
+    calls = []
+    original = getattr(ingestion, name)
+
+    async def wrapper(*args, **kwargs):
+        calls.append(args)
+        return await original(*args, **kwargs)
+    monkeypatch.setattr(ingestion, name, wrapper)
+    return calls
+
+async def wait_for(queue: IngestionQueue, *jobs, timeout: float = 30):
+    async def finished():
+        while any(queue.get(job.job_id).status in (JobStatus.QUEUED, JobStatus.RUNNING) for job in jobs):
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(finished(), timeout)
+    return [queue.get(job.job_id) for job in jobs]
+
+def test_job_runs_every_stage_and_registers_the_document(tmp_path, upload, vector_db):
+    path, content_hash = upload(make_pdf("quarterly revenue grew"))
+
+    async def run():
+        queue = IngestionQueue(str(tmp_path / "jobs"), workers=1)
+        await queue.start()
+        job = queue.submit(1, "report.pdf", "Q3 Report", path, content_hash)
+        [job] = await wait_for(queue, job)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == JobStatus.COMPLETED, job.error
+    assert job.progress == 1.0
+    assert job.result.metadata.title == "Q3 Report"
+    assert job.result.metadata.num_pages == 3
+    assert vector_db.count("documents").count == len(job.result.chunk_ids) > 0
+    assert not (tmp_path / "jobs" / job.job_id / "upload.pdf").exists()
+    with SessionLocal() as db:
+        assert db.query(PDFDocument).filter(PDFDocument.content_hash == content_hash).one().doc_id == job.doc_id
+
+def test_interrupted_job_resumes_after_its_last_finished_stage(tmp_path, upload, monkeypatch):
+    path, content_hash = upload(make_pdf("margins expanded"))
+    directory = str(tmp_path / "jobs")
+    analyze_document = ingestion.analyze_document
+
+    async def interrupted():
+        reached = asyncio.Event()
+
+        async def hang(*args):
+            reached.set()
+            await asyncio.Event().wait()
+        monkeypatch.setattr(ingestion, "analyze_document", hang)
+        queue = IngestionQueue(directory, workers=1)
+        await queue.start()
+        job = queue.submit(1, "report.pdf", None, path, content_hash)
+        await asyncio.wait_for(reached.wait(), 30)
+        # Shutting down mid-analysis, as a restart would
+        await queue.stop()
+        return job
+
+    async def resumed(job_id: str):
+        monkeypatch.setattr(ingestion, "analyze_document", analyze_document)
+        extracts = counting(monkeypatch, "extract_pdf")
+        queue = IngestionQueue(directory, workers=1)
+        await queue.start()
+        [job] = await wait_for(queue, queue.get(job_id))
+        await queue.stop()
+        return job, extracts
+
+    first = asyncio.run(interrupted())
+    assert first.status == JobStatus.QUEUED
+    assert first.stage == "analyze"
+
+    job, extracts = asyncio.run(resumed(first.job_id))
+    assert job.status == JobStatus.COMPLETED, job.error
+    assert extracts == []
+    assert job.doc_id == first.doc_id
+
+def test_identical_uploads_in_flight_share_one_pipeline_run(tmp_path, upload, monkeypatch):
+    content = make_pdf("guidance was raised")
+    embeds = counting(monkeypatch, "store_in_vector_db")
+
+    async def run():
+        queue = IngestionQueue(str(tmp_path / "jobs"), workers=2)
+        await queue.start()
+        first = queue.submit(1, "a.pdf", "Annual report", *upload(content))
+        second = queue.submit(2, "b.pdf", "Copy", *upload(content))
+        jobs = await wait_for(queue, first, second)
+        # Once registered, a re-upload completes without being queued
+        third = queue.submit(3, "c.pdf", None, *upload(content))
+        await queue.stop()
+        return jobs + [third]
+
+    first, second, third = asyncio.run(run())
+    assert len(embeds) == 1
+    assert [job.status for job in (first, second, third)] == [JobStatus.COMPLETED] * 3
+    assert first.doc_id == second.doc_id == third.doc_id
+    assert not first.result.duplicate
+    assert second.result.duplicate and third.result.duplicate
+    assert (second.result.filename, second.result.metadata.title) == ("b.pdf", "Copy")
+    assert third.result.metadata.title == "Annual report"
+
+def test_waiting_upload_takes_over_when_the_first_job_fails(tmp_path, upload, monkeypatch):
+    content = make_pdf("buybacks continued")
+    store_in_vector_db = ingestion.store_in_vector_db
+    calls = []
+
+    async def fail_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("vector database unavailable")
+        return await store_in_vector_db(*args, **kwargs)
+    monkeypatch.setattr(ingestion, "store_in_vector_db", fail_once)
+
+    async def run():
+        queue = IngestionQueue(str(tmp_path / "jobs"), workers=2)
+        await queue.start()
+        first = queue.submit(1, "a.pdf", None, *upload(content))
+        second = queue.submit(2, "b.pdf", None, *upload(content))
+        jobs = await wait_for(queue, first, second)
+        await queue.stop()
+        return jobs
+
+    first, second = asyncio.run(run())
+    assert first.status == JobStatus.FAILED
+    assert first.error == "vector database unavailable"
+    assert second.status == JobStatus.COMPLETED, second.error
+    assert not second.result.duplicate
+    assert len(calls) == 2
+
+def test_point_ids_are_derived_from_the_content(tmp_path, upload, vector_db):
+    content = make_pdf("dividend was maintained")
+
+    async def ingest(directory: str):
+        queue = IngestionQueue(directory, workers=1)
+        await queue.start()
+        [job] = await wait_for(queue, queue.submit(1, "a.pdf", None, *upload(content)))
+        await queue.stop()
+        return job
+
+    first = asyncio.run(ingest(str(tmp_path / "first")))
+    points = vector_db.count("documents").count
+    # Forget the registry so the same bytes run the whole pipeline again
+    with SessionLocal() as db:
+        db.query(PDFDocument).delete()
+        db.commit()
+    second = asyncio.run(ingest(str(tmp_path / "second")))
+
+    assert second.doc_id == first.doc_id
+    assert not second.result.duplicate
+    assert vector_db.count("documents").count == points
+
+def upload_file(content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="report.pdf")
+
+def test_spool_upload_streams_to_disk_and_hashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_spool_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "upload_chunk_size", 1000)
+    content = make_pdf("free cash flow rose")
+
+    path, size, content_hash = asyncio.run(spool_upload(upload_file(content)))
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert size == len(content)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+
+def test_spool_upload_rejects_oversized_files_and_removes_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_spool_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "upload_chunk_size", 1000)
+    monkeypatch.setattr(settings, "upload_max_bytes", 2500)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_upload(upload_file(b"x" * 5000)))
+    assert error.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+def test_spool_upload_surfaces_the_original_error_when_open_fails(tmp_path, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise PermissionError("spool directory is read-only")
+    monkeypatch.setattr(settings, "upload_spool_dir", str(tmp_path))
+    monkeypatch.setattr(uploads, "open", refuse, raising=False)
+
+    with pytest.raises(PermissionError):
+        asyncio.run(spool_upload(upload_file(b"%PDF")))
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from app.services.rate_limiter import SingleFlight, TokenBucket
+
+def test_token_bucket_throttles_once_the_burst_is_spent():
+    async def run():
+        bucket = TokenBucket(rate_per_minute=600, burst=2)
+        started = time.monotonic()
+        throttled = [await bucket.acquire() for _ in range(3)]
+        return throttled, time.monotonic() - started
+
+    throttled, elapsed = asyncio.run(run())
+    assert throttled == [False, False, True]
+    # 600 per minute refills a token every 0.1s
+    assert 0.08 <= elapsed < 0.5
+
+def test_token_bucket_refills_over_time():
+    async def run():
+        bucket = TokenBucket(rate_per_minute=6000, burst=1)
+        await bucket.acquire()
+        await asyncio.sleep(0.05)
+        return await bucket.acquire()
+
+    assert asyncio.run(run()) is False
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "payload"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(flights.do("key", fetch), flights.do("key", fetch))
+        return results, flights.in_flight()
+
+    results, in_flight = asyncio.run(run())
+    assert calls == 1
+    assert results == [("payload", False), ("payload", True)]
+    assert in_flight == 0
+
+def test_cancelled_follower_does_not_cancel_the_shared_call():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "payload"
+
+    async def run():
+        flights = SingleFlight()
+        leader = asyncio.ensure_future(flights.do("key", fetch))
+        follower = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(run()) == ("payload", False)
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services.query_parser import SymbolTrie, classify_query, extract_symbols
+from app.services.query_planner import plan_query
+
+@pytest.mark.parametrize("query, symbols", [
+    ("How is Apple doing?", ["AAPL"]),
+    ("Compare Apple's margins with Microsoft's", ["AAPL", "MSFT"]),
+    ("Apple’s guidance vs Google’s", ["AAPL", "GOOGL"]),
+    ("What do analysts say about NVDA's earnings", ["NVDA"]),
+    ("Is Bank of America a buy?", ["BAC"]),
+    ("johnson & johnson dividend", ["JNJ"]),
+    ("McDonald's and Lowe's", ["MCD", "LOW"]),
+    ("$TSLA vs $F", ["TSLA", "F"]),
+    ("Tesla, Tesla and TSLA again", ["TSLA"]),
+])
+def test_extract_symbols(query, symbols):
+    assert extract_symbols(query) == symbols
+
+@pytest.mark.parametrize("query", ["is cat food a good buy", "how low can it go", "the ma in the dis"])
+def test_ambiguous_tickers_need_capitals_or_a_cashtag(query):
+    assert extract_symbols(query) == []
+
+def test_ambiguous_tickers_count_in_capitals():
+    assert extract_symbols("CAT vs DE") == ["CAT", "DE"]
+
+def test_trie_prefers_the_longest_name():
+    trie = SymbolTrie()
+    trie.add(["bank"], "BANK")
+    trie.add(["bank", "of", "america"], "BAC")
+
+    assert trie.longest_match(["bank", "of", "america", "stock"], 0) == ("BAC", 3)
+    assert trie.longest_match(["bank", "of", "england"], 0) == ("BANK", 1)
+    assert trie.longest_match(["bank", "of", "england"], 1) == (None, 0)
+
+@pytest.mark.parametrize("query, query_type, symbols", [
+    ("Compare Apple's and Microsoft's margins", "COMPARISON", ["AAPL", "MSFT"]),
+    ("What is NVDA's RSI?", "SINGLE", ["NVDA"]),
+    ("Top 5 tech stocks to buy", "LIST", []),
+    ("What is a P/E ratio?", "GENERAL", []),
+])
+def test_classify_query(query, query_type, symbols):
+    result = classify_query(query)
+
+    assert result["type"] == query_type
+    assert result["symbols"] == symbols
+    assert result["confidence"] >= 0.75
+
+@pytest.mark.parametrize("query", [
+    "What is the price of PLUG?",
+    "How is AMC doing?",
+    "What are your thoughts on SOFI?",
+    "What is $rklb trading at?",
+    "What is the outlook for Rocket Lab stock?",
+    "What is the outlook for target?",
+    "Compare AAPL and PLUG",
+])
+def test_unresolved_securities_defer_to_the_llm(query):
+    assert classify_query(query)["confidence"] < settings.query_parser_confidence_threshold
+
+@pytest.mark.parametrize("query", [
+    "What is a P/E ratio?",
+    "How does inflation affect stocks?",
+    "Is the US economy in a recession?",
+    "Best stocks under $5",
+])
+def test_concept_questions_and_acronyms_stay_local(query):
+    assert classify_query(query)["confidence"] >= settings.query_parser_confidence_threshold
+
+def test_planner_asks_the_llm_about_unknown_tickers():
+    plan = asyncio.run(plan_query("What is the price of PLUG?"))
+
+    assert plan.source == "llm"